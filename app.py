@@ -2,15 +2,19 @@ import os
 import json
 import copy
 import base64
+import functools
 import logging
 import asyncio
+import hashlib
+import heapq
 import secrets
 import re
+import time
+import weakref
 
 from urllib.parse import quote_plus
-import tempfile
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Tuple, Callable, Awaitable
 from contextlib import asynccontextmanager
 from pathlib import Path
 
@@ -18,7 +22,7 @@ import aiohttp
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Body, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse, FileResponse
+from fastapi.responses import JSONResponse as _StarletteJSONResponse, HTMLResponse, FileResponse
 from pydantic import BaseModel
 import openai
 
@@ -47,12 +51,19 @@ def _postgres_reachable(url: str) -> bool:
         return False
 
 
+# Development default when no URL is configured: a local Postgres over its Unix
+# socket (no TCP/TLS; sub-millisecond round trips), used only if it answers.
+LOCAL_POSTGRES_URL = os.getenv("LOCAL_POSTGRES_URL", "postgresql:///bozorlik?host=/var/run/postgresql")
+
+
 def _resolve_db_url() -> Optional[str]:
     """Pick the DB URL. In development, fall back to SQLite when Postgres is down,
     so the app can be launched locally (e.g. VS Code "Run") without a DB server."""
     url = os.environ.get("POSTGRES_URL") or os.environ.get("DATABASE_URL")
     env = os.getenv("ENV", "development")
     if not url:
+        if env != "production" and _postgres_reachable(LOCAL_POSTGRES_URL):
+            return LOCAL_POSTGRES_URL
         return None
     if url.startswith("sqlite"):
         _patch_jsonb_for_sqlite()
@@ -74,6 +85,21 @@ try:
 except ImportError:
     from shared_storage import JsonSharedListRepository, SharedListService
 
+try:
+    from mini_app import json_codec
+    from mini_app.bounded_cache import BoundedCache
+except ImportError:
+    import json_codec
+    from bounded_cache import BoundedCache
+
+
+class JSONResponse(_StarletteJSONResponse):
+    """JSONResponse rendered through json_codec (orjson): same UTF-8 output as
+    Starlette's json.dumps(ensure_ascii=False), several times faster on lists."""
+
+    def render(self, content: Any) -> bytes:
+        return json_codec.dumps_bytes(content)
+
 
 # ===== CONFIGURATION =====
 class Config:
@@ -102,6 +128,13 @@ class Config:
     OPENAI_TIMEOUT: int = 60
     HTTP_REQUEST_TIMEOUT: int = 30
 
+    # How long identical GPT list/edit requests are answered from memory (seconds).
+    LLM_CACHE_TTL: int = int(os.getenv("LLM_CACHE_TTL", "1800"))
+
+    # Queued WebSocket messages are coalesced for this long into one frame.
+    WS_BATCH_DELAY_MS: int = int(os.getenv("WS_BATCH_DELAY_MS", "20"))
+    WS_BATCH_MAX_MESSAGES: int = 128
+
 
 # Validate environment variables
 if not Config.OPENAI_API_KEY:
@@ -116,6 +149,8 @@ logger = logging.getLogger(__name__)
 
 
 # ===== LOCALIZATION =====
+SUPPORTED_LANGUAGES = frozenset(("ru", "uz"))
+
 LOCALIZATION = {
     "ru": {
         "kg": "кг", "g": "г", "l": "л", "ml": "мл", "pcs": "шт", "currency": "сум",
@@ -156,6 +191,21 @@ UNIT_MAPPING = {
 # Longest-first so "миллилитр" is tried before "мл", "мл" before "л", etc.
 _UNIT_PATTERNS_BY_LENGTH = sorted(UNIT_MAPPING.items(), key=lambda kv: len(kv[0]), reverse=True)
 
+# Whole-token unit regexes, compiled once: (unit, regex for lowered text, case-insensitive regex for sub).
+_UNIT_TOKEN_REGEXES = [
+    (unit,
+     re.compile(r"(?<![^\W\d])" + re.escape(pattern) + r"(?![^\W\d])", re.UNICODE),
+     re.compile(r"(?<![^\W\d])" + re.escape(pattern) + r"(?![^\W\d])", re.IGNORECASE | re.UNICODE))
+    for pattern, unit in _UNIT_PATTERNS_BY_LENGTH
+]
+
+# Pre-compiled regexes shared by the parsing helpers (hot path: one call per item).
+_WORD_TOKEN_RE = re.compile(r"[\w'’\-]+", re.UNICODE)
+_DECIMAL_RE = re.compile(r"\d+[.,]?\d*")
+_FIRST_NUMBER_RE = re.compile(r"(\d+[.,]?\d*)")
+_NON_WORD_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
 
 def _find_unit_in_text(text_lower: str) -> Optional[str]:
     """Find a measurement unit as a whole token in a quantity string.
@@ -164,8 +214,8 @@ def _find_unit_in_text(text_lower: str) -> Optional[str]:
     digits may ("500г", "1.5l"). Plain substring search wrongly turned
     "500 мл" into "500 л".
     """
-    for pattern, unit in _UNIT_PATTERNS_BY_LENGTH:
-        if re.search(r"(?<![^\W\d])" + re.escape(pattern) + r"(?![^\W\d])", text_lower, flags=re.UNICODE):
+    for unit, unit_re, _ in _UNIT_TOKEN_REGEXES:
+        if unit_re.search(text_lower):
             return unit
     return None
 
@@ -197,6 +247,21 @@ NUMBER_WORDS = {
     "dozen": "12", "half": "0.5",
 }
 
+# Word roots that mark an egg query ("яйца", "яйцо", "tuxum") — eggs are priced per piece.
+_EGG_MARKERS = ("яйц", "tuxum")
+
+
+def _is_egg_like(text_lower: str) -> bool:
+    return any(marker in text_lower for marker in _EGG_MARKERS)
+
+
+_NUMBER_WORDS_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(w) for w in sorted(NUMBER_WORDS, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE | re.UNICODE,
+)
+_COMPOUND_HUNDRED_RE = re.compile(r"\b100\s+([1-9]0)\b")
+_COMPOUND_TENS_RE = re.compile(r"\b(\d*[1-9]0)\s+([1-9])\b")
+
 # Obscene / illegal / unsafe items that must never be turned into a shopping item.
 # Matched as whole tokens (exact) and via the substring roots below.
 BLOCKED_EXACT_WORDS = {
@@ -229,7 +294,7 @@ def _is_blocked_product(name: str) -> bool:
     if not name:
         return False
     lowered = name.lower()
-    tokens = re.findall(r"[\w'’\-]+", lowered, flags=re.UNICODE)
+    tokens = _WORD_TOKEN_RE.findall(lowered)
     for token in tokens:
         cleaned = token.strip("'’-")
         if cleaned in BLOCKED_EXACT_WORDS:
@@ -248,16 +313,16 @@ def _strip_blocked_words(text: str) -> str:
             return " "
         return token
 
-    return re.sub(r"[\w'’\-]+", _keep, text, flags=re.UNICODE)
+    return _WORD_TOKEN_RE.sub(_keep, text)
 
 
 def _has_product_signal(text: str) -> bool:
     """True if text still has a usable (non-filler, non-number, non-unit) word."""
     if not text or not text.strip():
         return False
-    for token in re.findall(r"[\w'’\-]+", text.lower(), flags=re.UNICODE):
+    for token in _WORD_TOKEN_RE.findall(text.lower()):
         cleaned = token.strip("'’-")
-        if not cleaned or re.fullmatch(r"\d+[.,]?\d*", cleaned):
+        if not cleaned or _DECIMAL_RE.fullmatch(cleaned):
             continue
         if cleaned in UNIT_MAPPING or cleaned in SHOPPING_FILLER_WORDS:
             continue
@@ -274,15 +339,11 @@ def _convert_number_words(text: str) -> str:
         word = match.group(0)
         return NUMBER_WORDS.get(word.lower(), word)
 
-    pattern = re.compile(
-        r"\b(?:" + "|".join(re.escape(w) for w in sorted(NUMBER_WORDS, key=len, reverse=True)) + r")\b",
-        re.IGNORECASE | re.UNICODE,
-    )
-    converted = pattern.sub(_sub, text)
+    converted = _NUMBER_WORDS_RE.sub(_sub, text)
     # Collapse compound spoken numbers: "двадцать пять" → "20 5" → "25",
     # "o'n bir" → "10 1" → "11", "сто двадцать" → "100 20" → "120".
-    converted = re.sub(r"\b100\s+([1-9]0)\b", lambda m: str(100 + int(m.group(1))), converted)
-    converted = re.sub(r"\b(\d*[1-9]0)\s+([1-9])\b", lambda m: str(int(m.group(1)) + int(m.group(2))), converted)
+    converted = _COMPOUND_HUNDRED_RE.sub(lambda m: str(100 + int(m.group(1))), converted)
+    converted = _COMPOUND_TENS_RE.sub(lambda m: str(int(m.group(1)) + int(m.group(2))), converted)
     return converted
 
 
@@ -319,6 +380,7 @@ _UZ_STEM_SUFFIXES = sorted([
 _CYRILLIC_RE = re.compile(r"[а-яё]", re.IGNORECASE)
 
 
+@functools.lru_cache(maxsize=16384)
 def _stem_word(word: str) -> str:
     """Return a light stem of a single lowercase token (RU or UZ/Latin)."""
     w = word.lower().replace("ё", "е")
@@ -405,8 +467,6 @@ SYSTEM_PROMPTS = {
 ВАЖНО:
 - Даже если продукта, который написал пользователь, нет в базе средних цен (prices.json), AI ДОЛЖЕН составить список и включить этот продукт без указания цены (estimated price должен отсутствовать).
 - НИКОГДА не заменять или не выводить сообщение "Привет! Что нужно купить сегодня?" в ответ на сообщение, где пользователь явно перечисляет продукты или диктует их голосом. Если пользователь написал продукты — всегда формируй список, даже если цены отсутствуют.
-
-Запрос пользователя:
 """,
     "uz": """
 Ты — Bozorlik AI, xaridlar ro'yxatini tuzuvchi yordamchi.
@@ -442,8 +502,6 @@ FORMAT:
 MUHIM:
 - Agar foydalanuvchi yozgan mahsulot prices.json ichida bo'lmasa ham, AI ro'yxatni tuzishi va ushbu mahsulotni narxsiz kiritishi kerak (estimated price bo'lmasin).
 - Foydalanuvchi aniq mahsulotlarni yozgan yoki ovoz bilan diktirlagan bo'lsa, "Salom! Bugun nima xarid qilish kerak?" kabi salomlashuv javobini hech qachon chiqarmang. Har doim ro'yxat tuzing, narxlar bo'lmasa ham.
-
-Foydalanuvchi so'rovi:
 """
 }
 
@@ -460,7 +518,6 @@ SYSTEM_PROMPT_EDIT = {
     "category": "категория"
   }]
 }
-Сообщение:
 """,
     "uz": """
 Siz — xaridlar ro'yxatini tahrirlovchi AI. Xabardan o'zgarishlarni aniqlang.
@@ -474,10 +531,33 @@ FAQAT JSON formatida javob bering:
     "category": "kategoriya"
   }]
 }
-Xabar:
 """
 }
 
+# Labels that introduce the user's text. They travel in the user message, not the
+# system prompt, so every request starts with a byte-identical system prefix that
+# OpenAI's automatic prompt caching can reuse.
+USER_TEXT_LABELS = {
+    "list": {"ru": "Запрос пользователя:", "uz": "Foydalanuvchi so'rovi:"},
+    "edit": {"ru": "Сообщение:", "uz": "Xabar:"},
+}
+
+# Header of the catalog reference appended to SYSTEM_PROMPTS once prices are loaded.
+CATALOG_GLOSSARY_HEADER = {
+    "ru": "СПРАВОЧНИК КАТЕГОРИЙ (товары из базы цен; используй только для выбора категории, названия пиши как у пользователя):",
+    "uz": "KATEGORIYALAR MA'LUMOTNOMASI (narxlar bazasidagi mahsulotlar; faqat kategoriyani tanlash uchun, nomlarni foydalanuvchi yozganidek yozing):",
+}
+
+
+def _user_message(kind: str, lang: str, text: str) -> str:
+    return f"{USER_TEXT_LABELS[kind][lang]}\n{text}"
+
+
+def _prompt_cache_key(kind: str, lang: str) -> str:
+    """Stable routing key so OpenAI pins a prompt prefix to the same cache shard."""
+    return f"bozorlik-{kind}-{lang}-v1"
+
+
 # Extracts the dish name and headcount from a free-form request like
 # "Хочу приготовить плов на 10 человек". servings is null if not mentioned.
 SYSTEM_PROMPT_RECIPE = {
@@ -600,7 +680,7 @@ class BudgetRequest(BaseModel):
 if not _EFFECTIVE_DB_URL:
     raise RuntimeError('POSTGRES_URL or DATABASE_URL must be set for deployment')
 _backend = 'SQLite (local dev)' if _EFFECTIVE_DB_URL.startswith('sqlite') else 'Postgres'
-logger.info(f"Using {_backend} database backend: {_EFFECTIVE_DB_URL}")
+logger.info("Using %s database backend: %s", _backend, _EFFECTIVE_DB_URL)
 db = PostgresDatabaseManager(_EFFECTIVE_DB_URL)
 # wire shared list repository to Postgres-backed repo
 shared_repo = PostgresSharedListRepository(db)
@@ -608,10 +688,24 @@ shared_list_service = SharedListService(shared_repo)
 
 
 # ===== UTILITY FUNCTIONS =====
+# index.html (~230 KB) as (mtime_ns, text, UTF-8 bytes): read and encoded once,
+# re-read only when the file changes on disk.
+_index_html_cache: Optional[Tuple[int, str, bytes]] = None
+
+
+def _index_html() -> Tuple[str, bytes]:
+    global _index_html_cache
+    index_path = BASE_DIR / "index.html"
+    mtime_ns = index_path.stat().st_mtime_ns
+    if _index_html_cache is None or _index_html_cache[0] != mtime_ns:
+        raw = index_path.read_bytes()
+        _index_html_cache = (mtime_ns, raw.decode("utf-8"), raw)
+    return _index_html_cache[1], _index_html_cache[2]
+
+
 def render_shared_page_html(token: str) -> str:
     """Return the main app shell with an optional injected shared-token variable."""
-    index_path = BASE_DIR / "index.html"
-    html = index_path.read_text(encoding="utf-8")
+    html = _index_html()[0]
     if not token:
         return html
     token_script = f"<script>window.BOZORLIK_SHARED_TOKEN = {json.dumps(token)};</script>"
@@ -638,7 +732,7 @@ def normalize_quantity_display(qty_text: str, target_lang: str = "ru") -> str:
     original = qty_text.strip()
     qty_text_lower = original.lower()
 
-    number_match = re.search(r'(\d+[.,]?\d*)', qty_text_lower)
+    number_match = _FIRST_NUMBER_RE.search(qty_text_lower)
     if not number_match:
         return original
 
@@ -666,6 +760,22 @@ def format_price_with_currency(price: Optional[int], lang: str = "ru") -> str:
     return f"{formatted_price} {currency}"
 
 
+# Longest substring kept in PriceDatabase.name_gram_index.
+_NAME_GRAM_SIZE = 3
+# Distinct (query, lang) results kept by PriceDatabase.find_products.
+_FIND_PRODUCTS_CACHE_SIZE = 4096
+# Distinct list-item quotes kept by _quote_list_item.
+_ITEM_QUOTE_CACHE_SIZE = 4096
+
+# Display categories whose keyword lists apply to each language.
+_KEYWORD_CATEGORY_MARKERS = {
+    "ru": ("Овощи", "Фрукты", "Молочные", "Мясные", "Бакалея", "Напитки", "Чай",
+           "Приправы", "Гигиена", "Снеки", "Другое"),
+    "uz": ("Sabzavotlar", "Mevalar", "Sut", "Go'sht", "Oziq-ovqat", "Ichimliklar",
+           "Choy", "Ziravorlar", "Gigiyena", "Snacklar", "Boshqalar"),
+}
+
+
 # ===== PRICE DATABASE (JSON-based, unchanged) =====
 class PriceDatabase:
     def __init__(self, prices_file: str):
@@ -685,6 +795,20 @@ class PriceDatabase:
         self.alias_stem_map = {"ru": {}, "uz": {}}
         # Stemmed product names → canonical normalized name ("красной репы" → "красная репа").
         self.name_stem_map = {"ru": {}, "uz": {}}
+        # Substring index over normalized names: n-gram → positions in index_names.
+        self.index_names = {"ru": [], "uz": []}
+        self.name_gram_index = {"ru": {}, "uz": {}}
+        # Category hints as token postings: stem → positions in synonym_stem_entries.
+        self.synonym_stem_entries = {"ru": [], "uz": []}
+        self.synonym_stem_postings = {"ru": {}, "uz": {}}
+        # Category hints for substring matching: (variants, category keys) entries,
+        # posted under each variant's leading n-gram; short variants are always checked.
+        self.synonym_variant_entries = {"ru": [], "uz": []}
+        self.synonym_variant_postings = {"ru": {}, "uz": {}}
+        self.synonym_short_positions = {"ru": [], "uz": []}
+        # Items of each category_map key, for the category-hint fallback in find_products.
+        self.items_by_hint_category: Dict[str, List[Dict]] = {}
+        self._variants_cache: Dict[str, Tuple[str, ...]] = {}
         self.spices_keywords = [
             "зира", "приправа", "плов", "шашлык", "самса", "фунчоза",
             "мак", "лимонная кислота", "сахарная пудра", "чёрный перец",
@@ -755,6 +879,19 @@ class PriceDatabase:
             "🍿 Snacklar": {"db_categories": ["Бакалея"], "keywords": ["chips", "lavash", "pizza"]},
             "📝 Boshqalar": {"db_categories": [], "keywords": []},
         }
+        # Flat per-language (keyword, display category) index for
+        # _keyword_category_hits, built once instead of filtering the nested
+        # category → keywords map on every determine_category call. Entries stay
+        # grouped in display order, so hit order matches the nested scan.
+        self.keyword_category_index = {
+            lang: tuple(
+                (keyword, category)
+                for category, info in self.display_category_map.items()
+                if any(m in category for m in markers)
+                for keyword in info["keywords"]
+            )
+            for lang, markers in _KEYWORD_CATEGORY_MARKERS.items()
+        }
         self.category_map = {
             "vegetables": ["Овощи", "Sabzavotlar"],
             "fruits": ["Фрукты", "Mevalar"],
@@ -771,8 +908,8 @@ class PriceDatabase:
         if not name:
             return ""
         normalized = name.lower().replace("ё", "е").replace("ъ", "").replace("ъ", "")
-        normalized = re.sub(r'[^\w\s]', '', normalized)
-        return re.sub(r'\s+', ' ', normalized).strip()
+        normalized = _NON_WORD_RE.sub('', normalized)
+        return _WHITESPACE_RE.sub(' ', normalized).strip()
 
     def _apply_direct_aliases(self, normalized_query: str, lang: str) -> str:
         """Canonicalize a normalized query using prices.json aliases and name stems.
@@ -822,7 +959,7 @@ class PriceDatabase:
     def _default_item_bonus(self, item: Dict) -> int:
         """Prefer practical defaults (1 unit) when user didn't specify quantity."""
         qty_text = (item.get("quantity") or "").lower()
-        qty_match = re.search(r'(\d+[.,]?\d*)', qty_text)
+        qty_match = _FIRST_NUMBER_RE.search(qty_text)
         qty_value = None
         if qty_match:
             try:
@@ -844,8 +981,15 @@ class PriceDatabase:
             return -8
         return 0
 
-    def _word_variants(self, word: str) -> List[str]:
-        """Return simple lexical variants to improve matching for inflected words (RU + UZ)."""
+    def _word_variants(self, word: str) -> Tuple[str, ...]:
+        """Return simple lexical variants to improve matching for inflected words (RU + UZ).
+
+        Memoized per word: find_products asks for the same query words once per
+        candidate name.
+        """
+        cached = self._variants_cache.get(word)
+        if cached is not None:
+            return cached
         variants = {word, _stem_word(word)}
         if len(word) > 4:
             variants.add(word[:-1])
@@ -866,7 +1010,10 @@ class PriceDatabase:
             if word.endswith(suffix) and len(word) > len(suffix) + 2:
                 variants.add(word[:-len(suffix)])
 
-        return [v for v in variants if v]
+        result = tuple(v for v in variants if v)
+        if len(self._variants_cache) < 50000:
+            self._variants_cache[word] = result
+        return result
 
     def _query_word_in_name(self, query_word: str, indexed_name: str) -> bool:
         """Check whether query word or one of its variants matches indexed product name."""
@@ -914,7 +1061,7 @@ class PriceDatabase:
             elif self._query_word_in_name(query_word, item_name):
                 score += 10
 
-        egg_like_query = any(token in normalized_query for token in ["яйц", "яйцо", "tuxum"])
+        egg_like_query = _is_egg_like(normalized_query)
         if egg_like_query:
             # For eggs without explicit quantity, prefer per-piece so users can control amount easily.
             if self._is_per_piece_item(item):
@@ -937,6 +1084,101 @@ class PriceDatabase:
         label = _RU_UNIT_LABELS.get(unit, "")
         return f"{qty_str} {label}".strip()
 
+    def _build_name_gram_index(self, lang: str, search_index: Dict[str, List[Dict]]):
+        """Map every substring of up to _NAME_GRAM_SIZE chars to the names containing it."""
+        names = list(search_index)
+        gram_index: Dict[str, set] = {}
+        for pos, name in enumerate(names):
+            for size in range(1, _NAME_GRAM_SIZE + 1):
+                for start in range(len(name) - size + 1):
+                    gram_index.setdefault(name[start:start + size], set()).add(pos)
+        self.index_names[lang] = names
+        self.name_gram_index[lang] = gram_index
+
+    def _candidate_names(self, query_words: List[str], lang: str) -> List[str]:
+        """Indexed names that may contain every query word (or a variant), in index order.
+
+        A variant can only be a substring of a name that also contains its leading
+        n-gram, so the postings give a superset which _query_word_in_name confirms.
+        """
+        gram_index = self.name_gram_index.get(lang, {})
+        positions: Optional[set] = None
+        for word in query_words:
+            word_positions: set = set()
+            for variant in self._word_variants(word):
+                word_positions |= gram_index.get(variant[:_NAME_GRAM_SIZE], set())
+            positions = word_positions if positions is None else positions & word_positions
+            if not positions:
+                return []
+        names = self.index_names.get(lang, [])
+        return [names[pos] for pos in sorted(positions or ())]
+
+    def _build_synonym_stem_index(self, lang: str, synonym_index: Dict[str, List[str]]):
+        """Posting lists over category-hint stems, so a query only touches the
+        hints that share a stem with it (instead of re-stemming every hint)."""
+        entries: List[Tuple[int, List[str]]] = []
+        postings: Dict[str, List[int]] = {}
+        for norm_syn, category_keys in synonym_index.items():
+            syn_stems = set(_stem_tokens(norm_syn.split()))
+            if not syn_stems:
+                continue
+            pos = len(entries)
+            entries.append((len(syn_stems), category_keys))
+            for stem in syn_stems:
+                postings.setdefault(stem, []).append(pos)
+        self.synonym_stem_entries[lang] = entries
+        self.synonym_stem_postings[lang] = postings
+
+    def _build_synonym_variant_index(self, lang: str, synonym_index: Dict[str, List[str]]):
+        """A hint variant can only occur in a query that contains its first
+        n-gram, so the find_products hint fallback scans only the hints posted
+        under the query's n-grams instead of every hint."""
+        entries: List[Tuple[Tuple[str, ...], List[str]]] = []
+        postings: Dict[str, List[int]] = {}
+        short_positions: List[int] = []
+        for norm_syn, category_keys in synonym_index.items():
+            variants = self._word_variants(norm_syn)
+            pos = len(entries)
+            entries.append((variants, category_keys))
+            grams = set()
+            for variant in variants:
+                if len(variant) < _NAME_GRAM_SIZE:
+                    short_positions.append(pos)
+                    break
+                grams.add(variant[:_NAME_GRAM_SIZE])
+            else:
+                for gram in grams:
+                    postings.setdefault(gram, []).append(pos)
+        self.synonym_variant_entries[lang] = entries
+        self.synonym_variant_postings[lang] = postings
+        self.synonym_short_positions[lang] = short_positions
+
+    def _hint_keys_in_query(self, normalized_query: str, lang: str) -> List[List[str]]:
+        """Category keys of every hint with a variant inside the query, in prices.json order."""
+        index_lang = "ru" if lang == "ru" else "uz"
+        entries = self.synonym_variant_entries[index_lang]
+        postings = self.synonym_variant_postings[index_lang]
+        candidates = set(self.synonym_short_positions[index_lang])
+        for i in range(len(normalized_query) - _NAME_GRAM_SIZE + 1):
+            candidates.update(postings.get(normalized_query[i:i + _NAME_GRAM_SIZE], ()))
+        result = []
+        for pos in sorted(candidates):
+            variants, category_keys = entries[pos]
+            if any(variant in normalized_query for variant in variants):
+                result.append(category_keys)
+        return result
+
+    def _hint_category_keys(self, query_stems: set, lang: str) -> List[List[str]]:
+        """Category keys of every hint whose stems all occur in the query, in prices.json order."""
+        index_lang = "ru" if lang == "ru" else "uz"
+        entries = self.synonym_stem_entries[index_lang]
+        postings = self.synonym_stem_postings[index_lang]
+        hits: Dict[int, int] = {}
+        for stem in query_stems:
+            for pos in postings.get(stem, ()):
+                hits[pos] = hits.get(pos, 0) + 1
+        return [entries[pos][1] for pos in sorted(hits) if hits[pos] == entries[pos][0]]
+
     def load_data(self):
         """Load the structured prices database (see prices.json):
 
@@ -945,9 +1187,10 @@ class PriceDatabase:
         - "aliases":        synonym → canonical product name (per language)
         - "category_hints": word → category key (fallback categorization)
         """
+        self._find_products_cache = BoundedCache(_FIND_PRODUCTS_CACHE_SIZE)
+        self._item_quote_cache = BoundedCache(_ITEM_QUOTE_CACHE_SIZE)
         try:
-            with open(self.prices_file, "r", encoding="utf-8") as f:
-                self.data = json.load(f)
+            self.data = json_codec.load_file(self.prices_file)
 
             self.category_defs = self.data.get("categories", {})
             self.display_by_key = {}
@@ -1007,6 +1250,9 @@ class PriceDatabase:
                     self.search_index_uz.setdefault(norm_uz, []).append(item_data)
                     self.name_stem_map["uz"].setdefault(_stem_phrase(norm_uz), norm_uz)
 
+            self._build_name_gram_index("ru", self.search_index_ru)
+            self._build_name_gram_index("uz", self.search_index_uz)
+
             # Product aliases: "морковка" → "Морковь красная" (stored normalized).
             aliases = self.data.get("aliases", {})
             for lang in ("ru", "uz"):
@@ -1029,10 +1275,24 @@ class PriceDatabase:
                 norm_syn = self._normalize_for_index(synonym)
                 if norm_syn:
                     self.synonym_index_uz.setdefault(norm_syn, []).append(category_key)
-
-            logger.info(f"Loaded {item_counter} products from {self.prices_file}")
+            self._build_synonym_stem_index("ru", self.synonym_index_ru)
+            self._build_synonym_stem_index("uz", self.synonym_index_uz)
+
+            self.items_by_hint_category = {}
+            for category_key, possible_categories in self.category_map.items():
+                if len(possible_categories) >= 2:
+                    cat_ru, cat_uz = possible_categories[0], possible_categories[1]
+                    self.items_by_hint_category[category_key] = [
+                        item for item in self.items_by_id.values()
+                        if item["category_ru"] == cat_ru or item["category_uz"] == cat_uz
+                    ]
+            self._variants_cache = {}
+            self._build_synonym_variant_index("ru", self.synonym_index_ru)
+            self._build_synonym_variant_index("uz", self.synonym_index_uz)
+
+            logger.info("Loaded %s products from %s", item_counter, self.prices_file)
         except Exception as e:
-            logger.error(f"Error loading prices: {e}")
+            logger.error("Error loading prices: %s", e)
             self.data = None
 
     def _extract_unit(self, quantity_str: str) -> str:
@@ -1041,7 +1301,7 @@ class PriceDatabase:
     def is_spice(self, product_name: str) -> bool:
         """Whole-token spice detection ("мак" matches, "макароны" does not)."""
         name_lower = product_name.lower()
-        name_stems = set(_stem_tokens(re.findall(r"[\w'’\-]+", name_lower, flags=re.UNICODE)))
+        name_stems = set(_stem_tokens(_WORD_TOKEN_RE.findall(name_lower)))
         for keyword in self.spices_keywords:
             if " " in keyword:
                 if keyword in name_lower:
@@ -1051,6 +1311,20 @@ class PriceDatabase:
         return False
 
     def find_products(self, product_name: str, lang: str = "ru") -> List[Dict]:
+        """Top-10 catalog items for a query, best first.
+
+        Memoized per (query, lang): one list item is matched, priced and
+        categorized through several helpers that each search the same name.
+        Returns a fresh list; the catalog item dicts are shared as before.
+        """
+        key = (product_name, lang)
+        cached = self._find_products_cache.get(key)
+        if cached is None:
+            cached = tuple(self._find_products_uncached(product_name, lang))
+            self._find_products_cache.set(key, cached)
+        return list(cached)
+
+    def _find_products_uncached(self, product_name: str, lang: str) -> List[Dict]:
         normalized_query = self._normalize_for_index(product_name)
         normalized_query = self._apply_direct_aliases(normalized_query, lang)
         if not normalized_query:
@@ -1073,40 +1347,38 @@ class PriceDatabase:
                 if variant and variant != word:
                     query_variants.add(normalized_query.replace(word, variant))
 
+        index_lang = "ru" if lang == "ru" else "uz"
         search_index = self.search_index_ru if lang == "ru" else self.search_index_uz
         for candidate_query in query_variants:
             candidate_words = [w for w in candidate_query.split() if w]
             if not candidate_words:
                 continue
-            for idx_name, items in search_index.items():
+            for idx_name in self._candidate_names(candidate_words, index_lang):
                 if all(self._query_word_in_name(word, idx_name) for word in candidate_words):
-                    for item in items:
+                    for item in search_index[idx_name]:
                         add_scored_item(item)
 
         if not scored_items:
+            other_lang = "uz" if index_lang == "ru" else "ru"
             other_index = self.search_index_uz if lang == "ru" else self.search_index_ru
-            for idx_name, items in other_index.items():
+            for idx_name in self._candidate_names(query_words, other_lang):
                 if all(self._query_word_in_name(word, idx_name) for word in query_words):
-                    for item in items:
+                    for item in other_index[idx_name]:
                         add_scored_item(item)
 
         if not scored_items:
-            synonym_index = self.synonym_index_ru if lang == "ru" else self.synonym_index_uz
-            for norm_syn, category_keys in synonym_index.items():
-                if self._query_word_in_name(norm_syn, normalized_query):
-                    for category_key in category_keys:
-                        possible_categories = self.category_map.get(category_key, [])
-                        if len(possible_categories) >= 2:
-                            cat_ru, cat_uz = possible_categories[0], possible_categories[1]
-                            for item in self.items_by_id.values():
-                                if item["category_ru"] == cat_ru or item["category_uz"] == cat_uz:
-                                    add_scored_item(item)
-
-        sorted_items = sorted(
-            scored_items.values(),
-            key=lambda x: (-x[0], len(x[1].get(f"name_{lang}", "")))
-        )
-        return [item for _, item in sorted_items[:10]]
+            for category_keys in self._hint_keys_in_query(normalized_query, lang):
+                for category_key in category_keys:
+                    for item in self.items_by_hint_category.get(category_key, ()):
+                        add_scored_item(item)
+
+        # Decorate once into plain tuples (insertion index keeps ties stable) so
+        # the top-10 selection compares tuples natively instead of calling a key
+        # lambda per comparison, and skips sorting the whole candidate set.
+        name_field = f"name_{lang}"
+        decorated = [(-score, len(item.get(name_field, "")), order, item)
+                     for order, (score, item) in enumerate(scored_items.values())]
+        return [entry[3] for entry in heapq.nsmallest(10, decorated)]
 
     def choose_best_product_match(
         self,
@@ -1121,7 +1393,7 @@ class PriceDatabase:
 
         normalized_name = self._apply_direct_aliases(self._normalize_for_index(original_name), lang)
         requested_qty, requested_unit, _ = self.extract_quantity_from_text(requested_quantity_text)
-        egg_like_query = any(token in normalized_name for token in ["яйц", "яйцо", "tuxum"])
+        egg_like_query = _is_egg_like(normalized_name)
 
         best_item = None
         best_score = -10**9
@@ -1172,7 +1444,7 @@ class PriceDatabase:
 
     def extract_quantity_from_text(self, text: str) -> Tuple[Optional[float], Optional[str], str]:
         text_lower = text.lower()
-        number_match = re.search(r'(\d+[.,]?\d*)', text_lower)
+        number_match = _FIRST_NUMBER_RE.search(text_lower)
         if not number_match:
             return None, None, ""
 
@@ -1203,7 +1475,7 @@ class PriceDatabase:
         base_qty = product_item.get("base_qty")
         if not base_qty:
             base_qty = 1.0
-            base_qty_match = re.search(r'(\d+[.,]?\d*)', base_quantity_str)
+            base_qty_match = _FIRST_NUMBER_RE.search(base_quantity_str)
             if base_qty_match:
                 try:
                     base_qty = float(base_qty_match.group(1).replace(',', '.'))
@@ -1239,13 +1511,12 @@ class PriceDatabase:
             return estimated_price, final_quantity, True
         else:
             localized_quantity = base_quantity_str
-            for pattern, unit_en in _UNIT_PATTERNS_BY_LENGTH:
+            base_quantity_lower = base_quantity_str.lower()
+            for unit_en, unit_re, unit_re_ci in _UNIT_TOKEN_REGEXES:
                 if unit_en not in LOCALIZATION[target_lang]:
                     continue
-                unit_re = r"(?<![^\W\d])" + re.escape(pattern) + r"(?![^\W\d])"
-                if re.search(unit_re, base_quantity_str.lower(), flags=re.UNICODE):
-                    localized_quantity = re.sub(unit_re, LOCALIZATION[target_lang][unit_en],
-                                                base_quantity_str, flags=re.IGNORECASE | re.UNICODE)
+                if unit_re.search(base_quantity_lower):
+                    localized_quantity = unit_re_ci.sub(LOCALIZATION[target_lang][unit_en], base_quantity_str)
                     break
             return base_price, localized_quantity, False
 
@@ -1253,23 +1524,14 @@ class PriceDatabase:
         entry = self.display_by_key.get(category_key)
         if not entry:
             return None
-        return entry.get(lang if lang in ("ru", "uz") else "ru")
+        return entry.get(lang if lang in SUPPORTED_LANGUAGES else "ru")
 
     def _keyword_category_hits(self, name_lower: str, lang: str) -> Dict[str, int]:
         """Display categories whose keyword lists match the name, with hit counts."""
-        if lang == "ru":
-            markers = ["Овощи", "Фрукты", "Молочные", "Мясные", "Бакалея", "Напитки", "Чай",
-                       "Приправы", "Гигиена", "Снеки", "Другое"]
-        else:
-            markers = ["Sabzavotlar", "Mevalar", "Sut", "Go'sht", "Oziq-ovqat", "Ichimliklar",
-                       "Choy", "Ziravorlar", "Gigiyena", "Snacklar", "Boshqalar"]
         hits: Dict[str, int] = {}
-        for category, info in self.display_category_map.items():
-            if not any(m in category for m in markers):
-                continue
-            matches = sum(1 for keyword in info["keywords"] if keyword in name_lower)
-            if matches > 0:
-                hits[category] = matches
+        for keyword, category in self.keyword_category_index["ru" if lang == "ru" else "uz"]:
+            if keyword in name_lower:
+                hits[category] = hits.get(category, 0) + 1
         return hits
 
     def determine_category(self, product_name: str, lang: str = "ru") -> str:
@@ -1281,7 +1543,7 @@ class PriceDatabase:
         """
         name_lower = product_name.lower()
 
-        if any(k in name_lower for k in ["яйц", "яйцо", "tuxum"]):
+        if _is_egg_like(name_lower):
             return "📦 Бакалея" if lang == "ru" else "📦 Oziq-ovqat"
 
         keyword_hits = self._keyword_category_hits(name_lower, lang)
@@ -1323,16 +1585,13 @@ class PriceDatabase:
                     return display
 
         # 4) Category hints from prices.json: known words without a product entry.
-        synonym_index = self.synonym_index_ru if lang == "ru" else self.synonym_index_uz
         normalized = self._normalize_for_index(product_name)
         query_stems = set(_stem_tokens(normalized.split()))
         if query_stems:
-            for norm_syn, category_keys in synonym_index.items():
-                syn_stems = set(_stem_tokens(norm_syn.split()))
-                if syn_stems and syn_stems <= query_stems:
-                    display = self._display_category_for_key(category_keys[0], lang)
-                    if display:
-                        return display
+            for category_keys in self._hint_category_keys(query_stems, lang):
+                display = self._display_category_for_key(category_keys[0], lang)
+                if display:
+                    return display
 
         return "📝 Другое" if lang == "ru" else "📝 Boshqalar"
 
@@ -1340,23 +1599,97 @@ class PriceDatabase:
 # Initialize price database
 price_db = PriceDatabase(Config.PRICES_FILE)
 
+
+def _build_catalog_glossary(lang: str) -> str:
+    """Catalog products grouped by category, in prices.json order (deterministic).
+
+    Appended to SYSTEM_PROMPTS once at import: it anchors GPT's category choice
+    to the catalog and pushes the static prefix past OpenAI's 1024-token
+    prompt-caching threshold.
+    """
+    if not price_db.data:
+        return ""
+    names_by_category: Dict[str, List[str]] = {}
+    for product in price_db.data.get("products", []):
+        name = (product.get(lang) or "").strip()
+        if not name:
+            continue
+        names = names_by_category.setdefault(product.get("category", "other"), [])
+        if name not in names:
+            names.append(name)
+    lines = [CATALOG_GLOSSARY_HEADER[lang]]
+    for category_key, names in names_by_category.items():
+        display = price_db._display_category_for_key(category_key, lang)
+        if display:
+            lines.append(f"{display}: {', '.join(names)}")
+    return "\n" + "\n".join(lines) + "\n" if len(lines) > 1 else ""
+
+
+for _lang in SYSTEM_PROMPTS:
+    SYSTEM_PROMPTS[_lang] += _build_catalog_glossary(_lang)
+
 # ===== OPENAI CLIENT =====
+# async_client serves coroutine call sites so a GPT/Whisper round-trip never blocks
+# the event loop; the sync client is kept for helpers that run in worker threads
+# (receipt analysis, translation) or on sync code paths (recipe extraction).
 if Config.OPENAI_API_KEY:
     openai.api_key = Config.OPENAI_API_KEY
     client = openai.OpenAI(api_key=Config.OPENAI_API_KEY, timeout=Config.OPENAI_TIMEOUT)
+    async_client = openai.AsyncOpenAI(api_key=Config.OPENAI_API_KEY, timeout=Config.OPENAI_TIMEOUT)
 else:
     client = None
+    async_client = None
 
 
 def _is_openai_available() -> bool:
     return client is not None
 
 
+class LLMCache(BoundedCache):
+    """In-memory TTL cache for deterministic GPT calls (fixed prompt + temperature).
+
+    Keys are BLAKE2b-128 hashes of (kind, model, lang, text), so the same list typed
+    twice is answered without another OpenAI round-trip. Oldest entries are
+    evicted first once max_entries is reached.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        super().__init__(max_entries, ttl=ttl)
+
+    @staticmethod
+    def make_key(kind: str, model: str, lang: str, text: str) -> str:
+        payload = json_codec.dumps_bytes({"kind": kind, "model": model, "lang": lang, "text": text.strip()})
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+llm_cache = LLMCache(Config.LLM_CACHE_TTL)
+
+
 def _voice_max_size_bytes() -> int:
     return max(1, Config.MAX_VOICE_FILE_SIZE_MB) * 1024 * 1024
 
-# ===== RUNTIME STATE (only for websockets) =====
-websocket_connections: Dict[int, WebSocket] = {}
+# ===== SHARED HTTP SESSION =====
+# One pooled aiohttp session for outbound calls (Telegram Bot API), so repeat
+# requests reuse keep-alive connections instead of a new TCP+TLS handshake.
+# Created lazily (serverless entrypoints may skip lifespan) and closed on shutdown.
+_http_session: Optional[aiohttp.ClientSession] = None
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=Config.HTTP_REQUEST_TIMEOUT),
+        )
+    return _http_session
+
+
+async def close_http_session() -> None:
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
 
 
 # ===== LIST PROCESSING FUNCTIONS =====
@@ -1382,60 +1715,109 @@ def merge_categories(current_categories: Dict[str, List[Dict]], new_categories:
     return result
 
 
-async def format_list_with_gpt(text: str, lang: str = "ru") -> str:
+async def _stream_completion_lines(completion, on_line: Callable[[str], Awaitable[None]]) -> str:
+    """Consume a streamed chat completion, passing each finished non-empty line
+    to on_line as soon as it arrives. Returns the full text."""
+    parts: List[str] = []
+    pending = ""
+    async for chunk in completion:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        parts.append(delta)
+        pending += delta
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            if line.strip():
+                await on_line(line.strip())
+    if pending.strip():
+        await on_line(pending.strip())
+    return "".join(parts)
+
+
+async def format_list_with_gpt(text: str, lang: str = "ru",
+                               on_line: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+    """Format free text into the "emoji Category:" / "• item — qty" list via GPT.
+
+    With on_line the completion is streamed and every finished line is handed
+    over while GPT is still generating (e.g. to push it to the user's WebSocket);
+    the full text is returned either way.
+    """
     if not _is_openai_available():
         return (
             "Сервис AI временно недоступен: не настроен OPENAI_API_KEY."
             if lang == "ru"
             else "AI xizmati vaqtincha mavjud emas: OPENAI_API_KEY sozlanmagan."
         )
+    cache_key = LLMCache.make_key("list", Config.CHAT_MODEL, lang, text)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        if on_line:
+            for line in cached.split("\n"):
+                if line.strip():
+                    await on_line(line.strip())
+        return cached
     try:
-        completion = client.chat.completions.create(
+        completion = await async_client.chat.completions.create(
             model=Config.CHAT_MODEL,
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPTS[lang]},
-                {"role": "user", "content": text},
+                {"role": "user", "content": _user_message("list", lang, text)},
             ],
             temperature=0.3,
-            max_tokens=1000
+            max_tokens=1000,
+            extra_body={"prompt_cache_key": _prompt_cache_key("list", lang)},
+            stream=on_line is not None,
         )
-        return completion.choices[0].message.content
+        if on_line:
+            content = await _stream_completion_lines(completion, on_line)
+        else:
+            content = completion.choices[0].message.content
+        if content:
+            llm_cache.set(cache_key, content)
+        return content
     except Exception as e:
-        logger.error(f"GPT error: {e}")
+        logger.error("GPT error: %s", e)
         return "Извините, произошла ошибка при обработке запроса." if lang == "ru" else "Kechirasiz, so'rovni qayta ishlashda xatolik yuz berdi."
 
 
+# Category header emojis GPT starts a "🥕 Овощи:" line with (all single code points,
+# so a header is recognised by one set lookup on the line's first character).
+_CATEGORY_HEADER_EMOJIS = frozenset(["🥕", "🍎", "🥛", "🍖", "📦", "🥤", "🧴", "🧂", "📝", "🍵", "🍿", "🥚"])
+# "Other" headers whose items get re-categorized, and the spice headers.
+_GENERIC_OTHER_CATEGORIES = frozenset(["📝 Другое", "📝 Boshqalar", "Другое", "Boshqalar"])
+_SPICE_CATEGORIES = frozenset(["🧂 Приправы", "🧂 Ziravorlar"])
+
+
 def parse_shopping_list(text: str, lang: str = "ru") -> Dict[str, List[Dict]]:
     categories = {}
     current_category = None
-    emojis = ["🥕", "🍎", "🥛", "🍖", "📦", "🥤", "🧴", "🧂", "📝", "🍵", "🍿", "🥚"]
+    spice_category = "🧂 Приправы" if lang == "ru" else "🧂 Ziravorlar"
 
     for line in text.split('\n'):
         line = line.strip()
         if not line:
             continue
 
-        category_found = False
-        for emoji in emojis:
-            if line.startswith(emoji) and (':' in line or line.endswith(':')):
-                current_category = line.split(':')[0].strip()
+        # Dispatch on the first code point: bullets are items, anything else
+        # with a colon is a header (known emoji first, then "Категория:" styles).
+        first = line[0]
+        if first != '•':
+            if ':' not in line:
+                continue
+            header = line.partition(':')[0].strip()
+            if first in _CATEGORY_HEADER_EMOJIS:
+                current_category = header
                 categories[current_category] = []
-                category_found = True
-                break
-
-        # Fallback category detection for unexpected emoji/styles: "Категория:" lines.
-        if not category_found and not line.startswith('•') and ':' in line:
-            possible_header = line.split(':', 1)[0].strip()
-            if 2 <= len(possible_header) <= 60:
-                current_category = possible_header
+            elif 2 <= len(header) <= 60:
+                current_category = header
                 if current_category not in categories:
                     categories[current_category] = []
-                category_found = True
-
-        if category_found:
             continue
 
-        if line.startswith('•') and current_category:
+        if current_category:
             item_text = line[1:].strip()
             if '—' in item_text:
                 parts = item_text.split('—', 1)
@@ -1454,16 +1836,14 @@ def parse_shopping_list(text: str, lang: str = "ru") -> Dict[str, List[Dict]]:
                 continue
 
             target_category = current_category
-            generic_other_categories = {"📝 Другое", "📝 Boshqalar", "Другое", "Boshqalar"}
-            if current_category in generic_other_categories:
+            if current_category in _GENERIC_OTHER_CATEGORIES:
                 detected_category = get_display_category_for_product(product_name, lang)
-                if detected_category not in generic_other_categories:
+                if detected_category not in _GENERIC_OTHER_CATEGORIES:
                     target_category = detected_category
                     if target_category not in categories:
                         categories[target_category] = []
 
-            if price_db.is_spice(product_name) and target_category not in ["🧂 Приправы", "🧂 Ziravorlar"]:
-                spice_category = "🧂 Приправы" if lang == "ru" else "🧂 Ziravorlar"
+            if price_db.is_spice(product_name) and target_category not in _SPICE_CATEGORIES:
                 if spice_category not in categories:
                     categories[spice_category] = []
                 categories[spice_category].append({
@@ -1486,6 +1866,12 @@ def _build_unit_pattern() -> str:
 # Pre-compiled unit pattern used by quantity extraction helpers.
 _UNIT_PATTERN = _build_unit_pattern()
 
+_BULLET_PREFIX_RE = re.compile(r'^[•\-\*\s]+')
+# "qty unit product"  e.g. "2 кг картошки"
+_QTY_PREFIX_RE = re.compile(r'^(\d+[.,]?\d*)\s*' + _UNIT_PATTERN + r'\s+(.+)$', re.IGNORECASE | re.UNICODE)
+# "product qty unit"  e.g. "картошка 15 кг" or "cola 1.5l"
+_QTY_SUFFIX_RE = re.compile(r'(\d+[.,]?\d*)\s*' + _UNIT_PATTERN + r'(?:\s|$)', re.IGNORECASE | re.UNICODE)
+
 
 def _extract_name_and_quantity(fragment: str, lang: str) -> Tuple[str, str]:
     """Extract (product_name, quantity_display) from a text fragment.
@@ -1494,16 +1880,12 @@ def _extract_name_and_quantity(fragment: str, lang: str) -> Tuple[str, str]:
       - "product qty unit"  →  "картошка 15 кг"
       - "qty unit product"  →  "2 кг картошки"
     """
-    cleaned = re.sub(r'^[•\-\*\s]+', '', fragment.strip())
+    cleaned = _BULLET_PREFIX_RE.sub('', fragment.strip())
     if not cleaned:
         return "", ""
 
     # Pattern: "qty unit product"  e.g. "2 кг картошки"
-    prefix_re = re.compile(
-        r'^(\d+[.,]?\d*)\s*' + _UNIT_PATTERN + r'\s+(.+)$',
-        re.IGNORECASE | re.UNICODE
-    )
-    m = prefix_re.match(cleaned)
+    m = _QTY_PREFIX_RE.match(cleaned)
     if m:
         num_str = m.group(1)
         unit_str = m.group(2).lower()
@@ -1514,11 +1896,7 @@ def _extract_name_and_quantity(fragment: str, lang: str) -> Tuple[str, str]:
         return capitalize_first_letter(name_str), qty_display
 
     # Pattern: "product qty unit"  e.g. "картошка 15 кг" or "cola 1.5l"
-    suffix_re = re.compile(
-        r'(\d+[.,]?\d*)\s*' + _UNIT_PATTERN + r'(?:\s|$)',
-        re.IGNORECASE | re.UNICODE
-    )
-    m = suffix_re.search(cleaned)
+    m = _QTY_SUFFIX_RE.search(cleaned)
     if m:
         num_str = m.group(1)
         unit_str = m.group(2).lower()
@@ -1535,6 +1913,8 @@ def _extract_name_and_quantity(fragment: str, lang: str) -> Tuple[str, str]:
     return capitalize_first_letter(cleaned), ""
 
 
+_FRAGMENT_SPLIT_RE = re.compile(r'[;,\n]+')
+
 # Standalone conjunctions that mark boundaries between product names.
 _CONJUNCTION_SPLIT_RE = re.compile(
     r'\s+(?:и|или|да|va|yoki|hamda|также|тоже)\s+',
@@ -1553,7 +1933,7 @@ def _smart_split_fragments(text: str) -> List[str]:
     "картошку 3 кг и лук"  ->  ["картошку 3 кг", "лук"]
     """
     # Pass 1: split on commas / semicolons / newlines.
-    comma_parts = [p.strip() for p in re.split(r'[;,\n]+', text) if p.strip()]
+    comma_parts = [p.strip() for p in _FRAGMENT_SPLIT_RE.split(text) if p.strip()]
     if not comma_parts:
         return [text.strip()] if text.strip() else []
 
@@ -1569,7 +1949,7 @@ def _smart_split_fragments(text: str) -> List[str]:
     while i < len(conj_parts):
         part = conj_parts[i]
         part_lower = part.lower()
-        is_pure_number = bool(re.fullmatch(r'\d+[.,]?\d*', part))
+        is_pure_number = bool(_DECIMAL_RE.fullmatch(part))
         is_pure_unit = part_lower in UNIT_MAPPING
 
         if is_pure_number or is_pure_unit:
@@ -1731,7 +2111,7 @@ def _is_noise_token(token: str) -> bool:
         return True
     if normalized in SHOPPING_UNIT_WORDS:
         return True
-    if re.fullmatch(r"\d+[.,]?\d*", normalized):
+    if _DECIMAL_RE.fullmatch(normalized):
         return True
     return False
 
@@ -1744,7 +2124,7 @@ def _is_valid_product_candidate(text: str) -> bool:
     stripped = text.strip().lower()
     if not stripped:
         return False
-    if re.fullmatch(r'\d+[.,]?\d*', stripped):
+    if _DECIMAL_RE.fullmatch(stripped):
         return False
     if stripped in UNIT_MAPPING:
         return False
@@ -1824,6 +2204,58 @@ def _score_match_confidence(original_name: str, best_match: Optional[Dict], lang
     return int(f1 * 400)
 
 
+def _confident_price(price: Optional[int], original_name: str, best_match: Dict, lang: str) -> Optional[int]:
+    """The catalog price if the match is confident enough, else None.
+
+    No price beats a wrong price. The confidence score is only computed when
+    there is a price to gate.
+    """
+    if price is None:
+        return None
+    if _score_match_confidence(original_name, best_match, lang) >= MATCH_CONFIDENCE_THRESHOLD:
+        return price
+    return None
+
+
+# _item_quote_cache marker for "not cached yet" (a cached quote may be None).
+_QUOTE_UNCACHED = object()
+
+
+def _quote_list_item(original_name: str, quantity: str, lang: str, expected_db_category: str = "",
+                     fallback_to_first: bool = False) -> Optional[Tuple[Optional[int], str, bool]]:
+    """Catalog quote for one list item: (estimated_price, normalized_quantity, user_specified),
+    or None when nothing matches.
+
+    Pure in its arguments and the loaded catalog, so it is memoized on price_db
+    (reset by load_data): every edit reprices the whole list, mostly unchanged items.
+    """
+    key = (original_name, quantity, lang, expected_db_category, fallback_to_first)
+    cache = price_db._item_quote_cache
+    quote = cache.get(key, _QUOTE_UNCACHED)
+    if quote is not _QUOTE_UNCACHED:
+        return quote
+
+    quote = None
+    matches = price_db.find_products(original_name, lang)
+    if matches:
+        best_match = price_db.choose_best_product_match(
+            matches,
+            original_name,
+            lang,
+            expected_db_category=expected_db_category,
+            requested_quantity_text=quantity
+        )
+        if not best_match and fallback_to_first:
+            best_match = matches[0]
+        if best_match:
+            # The match always normalizes the quantity; the price needs confidence.
+            price, normalized_qty, user_specified = price_db.calculate_price_for_product(best_match, quantity, lang)
+            quote = (_confident_price(price, original_name, best_match, lang), normalized_qty, user_specified)
+
+    cache.set(key, quote)
+    return quote
+
+
 def _build_direct_item(product_name: str, quantity: str, lang: str, original_name: Optional[str] = None,
                        user_specified_quantity: bool = False) -> Dict[str, Any]:
     display_name = capitalize_first_letter(product_name.strip())
@@ -1838,8 +2270,11 @@ def _build_direct_item(product_name: str, quantity: str, lang: str, original_nam
     }
 
 
+_NUMBER_OR_WORD_RE = re.compile(r"\d+[.,]?\d*|[\w'’\-]+", re.UNICODE)
+
+
 def _is_number_token(token: str) -> bool:
-    return bool(re.fullmatch(r"\d+[.,]?\d*", token))
+    return bool(_DECIMAL_RE.fullmatch(token))
 
 
 def _tokenize_with_numbers(text: str) -> List[str]:
@@ -1847,7 +2282,7 @@ def _tokenize_with_numbers(text: str) -> List[str]:
 
     "картошка 1.5кг" → ["картошка", "1.5", "кг"]
     """
-    return [t for t in re.findall(r"\d+[.,]?\d*|[\w'’\-]+", text.lower(), flags=re.UNICODE) if t]
+    return [t for t in _NUMBER_OR_WORD_RE.findall(text.lower()) if t]
 
 
 def _format_quantity(num: str, unit_token: str, lang: str) -> str:
@@ -1869,7 +2304,7 @@ def _parse_direct_segment(segment: str, lang: str) -> List[Dict[str, Any]]:
     ("картошка 2 кг" or "2 кг картошки"). Filler/command/noise tokens are dropped,
     spoken number words are converted to digits, and obscene/illegal items are skipped.
     """
-    cleaned_segment = re.sub(r"\s+", " ", segment.strip())
+    cleaned_segment = _WHITESPACE_RE.sub(" ", segment.strip())
     # Spoken numbers → digits ("два килограмма" → "2 килограмма").
     cleaned_segment = _convert_number_words(cleaned_segment)
     if not cleaned_segment:
@@ -2024,6 +2459,19 @@ def try_parse_direct_shopping_input(text: str, lang: str = "ru") -> Dict[str, Li
     return categories if categories else {}
 
 
+# GPT list headers → price DB category used to break ties between product matches.
+LIST_CATEGORY_DB_HINTS = {
+    "🥕 Овощи": "Овощи", "🍎 Фрукты": "Фрукты", "🥛 Молочные продукты": "Молочные продукты",
+    "🍖 Мясные продукты": "Мясные продукты", "📦 Бакалея": "Бакалея", "🥤 Напитки": "Напитки",
+    "🧴 Гигиена и быт": "Бакалея", "🧂 Приправы": "Приправы", "📝 Другое": "Бакалея",
+    "🍵 Чай и кофе": "Чай и кофе", "🍿 Снеки": "Бакалея",
+    "🥕 Sabzavotlar": "Овощи", "🍎 Mevalar": "Фрукты", "🥛 Sut mahsulotlari": "Молочные продукты",
+    "🍖 Go'sht mahsulotlari": "Мясные продукты", "📦 Oziq-ovqat": "Бакалея", "🥤 Ichimliklar": "Напитки",
+    "🧴 Gigiyena": "Бакалея", "🧂 Ziravorlar": "Приправы", "📝 Boshqalar": "Бакалея",
+    "🍵 Choy va kofe": "Чай и кофе", "🍿 Snacklar": "Бакалея",
+}
+
+
 def format_shopping_list_for_json(categories: Dict[str, List[Dict]], user_id: int, lang: str = "ru",
                                   original_text: str = "") -> Dict:
     result = {
@@ -2034,64 +2482,37 @@ def format_shopping_list_for_json(categories: Dict[str, List[Dict]], user_id: in
         "localization": LOCALIZATION[lang], "owner_id": user_id
     }
 
-    category_mapping = {
-        "🥕 Овощи": "Овощи", "🍎 Фрукты": "Фрукты", "🥛 Молочные продукты": "Молочные продукты",
-        "🍖 Мясные продукты": "Мясные продукты", "📦 Бакалея": "Бакалея", "🥤 Напитки": "Напитки",
-        "🧴 Гигиена и быт": "Бакалея", "🧂 Приправы": "Приправы", "📝 Другое": "Бакалея",
-        "🍵 Чай и кофе": "Чай и кофе", "🍿 Снеки": "Бакалея",
-        "🥕 Sabzavotlar": "Овощи", "🍎 Mevalar": "Фрукты", "🥛 Sut mahsulotlari": "Молочные продукты",
-        "🍖 Go'sht mahsulotlari": "Мясные продукты", "📦 Oziq-ovqat": "Бакалея", "🥤 Ichimliklar": "Напитки",
-        "🧴 Gigiyena": "Бакалея", "🧂 Ziravorlar": "Приправы", "📝 Boshqalar": "Бакалея",
-        "🍵 Choy va kofe": "Чай и кофе", "🍿 Snacklar": "Бакалея",
-    }
-
+    # Single pass: each item_data is built once and shared by "categories" and
+    # "items"; the counters are summed over "items" afterwards.
+    all_items = result["items"]
     for category, items in categories.items():
-        result["categories"][category] = []
-        result["total_items"] += len(items)
-        expected_db_category = category_mapping.get(category, "")
+        category_items = result["categories"][category] = []
+        expected_db_category = LIST_CATEGORY_DB_HINTS.get(category, "")
 
         for item in items:
             item["name"] = capitalize_first_letter(item["name"])
-            item["original_name"] = capitalize_first_letter(item["original_name"])
+            original_name = item["original_name"] = capitalize_first_letter(item["original_name"])
+            quantity = item.get("quantity", "")
+            purchased = item.get("purchased", False)
 
-            possible_products = price_db.find_products(item["original_name"], lang)
             item_data = {
-                "name": item["name"], "quantity": item.get("quantity", ""),
-                "purchased": item.get("purchased", False), "category": category,
+                "name": item["name"], "quantity": quantity,
+                "purchased": purchased, "category": category,
                 "estimated_price": None, "user_specified_quantity": item.get("user_specified_quantity", False)
             }
 
-            best_match = None
-            if possible_products:
-                best_match = price_db.choose_best_product_match(
-                    possible_products,
-                    item["original_name"],
-                    lang,
-                    expected_db_category=expected_db_category,
-                    requested_quantity_text=item.get("quantity", "")
-                )
-
-                if best_match:
-                    # Only assign a price when the match is confident enough.
-                    confidence = _score_match_confidence(item["original_name"], best_match, lang)
-                    price, final_quantity, user_specified = price_db.calculate_price_for_product(
-                        best_match, item.get("quantity", ""), lang
-                    )
-                    if confidence >= MATCH_CONFIDENCE_THRESHOLD:
-                        item_data["estimated_price"] = price
-                    else:
-                        # Keep the match for quantity normalization but skip price.
-                        item_data["estimated_price"] = None
-                    if user_specified:
-                        item_data["quantity"] = final_quantity
-
-            result["categories"][category].append(item_data)
-            result["items"].append(item_data)
-            if item_data["estimated_price"]:
-                result["total_estimated_price"] += item_data["estimated_price"]
-            if item.get("purchased"):
-                result["purchased_items"] += 1
+            quote = _quote_list_item(original_name, quantity, lang, expected_db_category)
+            if quote:
+                item_data["estimated_price"], final_quantity, user_specified = quote
+                if user_specified:
+                    item_data["quantity"] = final_quantity
 
+            category_items.append(item_data)
+            all_items.append(item_data)
+
+    result["total_items"] = len(all_items)
+    result["purchased_items"] = sum(1 for item_data in all_items if item_data["purchased"])
+    result["total_estimated_price"] = sum(filter(None, (item_data["estimated_price"] for item_data in all_items)))
     if result["total_items"] > 0 and result["purchased_items"] == result["total_items"]:
         result["all_purchased"] = True
         result["needs_confirmation"] = True
@@ -2099,23 +2520,69 @@ def format_shopping_list_for_json(categories: Dict[str, List[Dict]], user_id: in
     return result
 
 
+# Keyword routing for edit messages. A short message whose only command word is
+# an "add" keyword ("добавь молоко 2л") is unambiguous: its products are parsed by
+# the deterministic shopping parser and GPT is skipped. Anything mentioning
+# remove/replace/update words, or too long to be a plain list, still goes to GPT.
+EDIT_ADD_KEYWORDS = {
+    "ru": ["добавь", "добавить", "прибавь", "ещё", "плюс"],
+    "uz": ["qo'sh", "qo'shing", "yana", "plus"],
+}
+EDIT_NON_ADD_KEYWORDS = {
+    "ru": ["удали", "удалить", "убрать", "убери", "замени", "заменить", "измени", "поменяй",
+           "обнови", "вместо", "больше", "меньше"],
+    "uz": ["o'chir", "olib tashla", "almashtir", "o'zgartir", "yangila", "o'rniga", "ko'proq", "kamroq"],
+}
+LOCAL_EDIT_MAX_WORDS = 5
+
+
+def _route_edit_locally(text: str, lang: str) -> List[Dict]:
+    """Build "add" changes for a single-action add message without GPT; [] if unsure."""
+    text_lower = text.lower()
+    add_keywords = EDIT_ADD_KEYWORDS.get(lang, EDIT_ADD_KEYWORDS["ru"])
+    if not _contains_keyword(text_lower, add_keywords):
+        return []
+    if _contains_keyword(text_lower, EDIT_NON_ADD_KEYWORDS.get(lang, EDIT_NON_ADD_KEYWORDS["ru"])):
+        return []
+    remainder = _strip_keywords(text, add_keywords)
+    if not remainder or len(remainder.split()) > LOCAL_EDIT_MAX_WORDS:
+        return []
+    return [
+        {"action": "add", "new_item": item["name"], "quantity": item.get("quantity", "")}
+        for items in try_parse_direct_shopping_input(remainder, lang).values()
+        for item in items
+    ]
+
+
 async def detect_edit_changes(text: str, lang: str = "ru") -> List[Dict]:
+    local_changes = _route_edit_locally(text, lang)
+    if local_changes:
+        return local_changes
     if not _is_openai_available():
         return []
+    # The parsed changes are cached (not the raw reply) so hits skip parsing too;
+    # callers always get their own copy so a cached entry is never mutated.
+    cache_key = LLMCache.make_key("edit", Config.CHAT_MODEL, lang, text)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        return copy.deepcopy(cached)
     try:
-        completion = client.chat.completions.create(
+        completion = await async_client.chat.completions.create(
             model=Config.CHAT_MODEL,
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPT_EDIT[lang]},
-                {"role": "user", "content": text},
+                {"role": "user", "content": _user_message("edit", lang, text)},
             ],
-            temperature=0.1
+            temperature=0.1,
+            extra_body={"prompt_cache_key": _prompt_cache_key("edit", lang)},
         )
         response = completion.choices[0].message.content
-        data = json.loads(response)
-        return data.get("changes", [])
+        data = json_codec.loads(response)
+        changes = data.get("changes", [])
+        llm_cache.set(cache_key, copy.deepcopy(changes))
+        return changes
     except Exception as e:
-        logger.error(f"Edit detection error: {e}")
+        logger.error("Edit detection error: %s", e)
         return []
 
 
@@ -2155,16 +2622,15 @@ def load_recipes(force_reload: bool = False) -> Dict[str, Any]:
     if _RECIPES_CACHE is not None and not force_reload:
         return _RECIPES_CACHE
     try:
-        with open(Config.RECIPES_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = json_codec.load_file(Config.RECIPES_FILE)
         if not isinstance(data, dict):
             raise ValueError("recipes.json root must be an object")
         _RECIPES_CACHE = data
     except FileNotFoundError:
-        logger.warning(f"recipes.json not found at {Config.RECIPES_FILE}")
+        logger.warning("recipes.json not found at %s", Config.RECIPES_FILE)
         _RECIPES_CACHE = {}
     except Exception as e:
-        logger.error(f"Failed to load recipes.json: {e}")
+        logger.error("Failed to load recipes.json: %s", e)
         _RECIPES_CACHE = {}
     return _RECIPES_CACHE
 
@@ -2219,7 +2685,7 @@ def extract_dish_and_servings(text: str, lang: str = "ru") -> Tuple[str, Optiona
                 temperature=0.1,
                 response_format={"type": "json_object"},
             )
-            data = json.loads(completion.choices[0].message.content)
+            data = json_codec.loads(completion.choices[0].message.content)
             dish = (data.get("dish") or "").strip()
             servings = data.get("servings")
             if isinstance(servings, str):
@@ -2229,7 +2695,7 @@ def extract_dish_and_servings(text: str, lang: str = "ru") -> Tuple[str, Optiona
             if dish:
                 return dish, servings
         except Exception as e:
-            logger.error(f"extract_dish_and_servings LLM error: {e}")
+            logger.error("extract_dish_and_servings LLM error: %s", e)
 
     # Deterministic fallback (no key / LLM failure).
     return _find_dish_in_text(text, recipes), _extract_servings_regex(text)
@@ -2347,16 +2813,23 @@ _REPLACE_SPLIT_RE = {
 }
 
 
+@functools.lru_cache(maxsize=512)
+def _keyword_regex(keyword: str, ignore_case: bool = False) -> "re.Pattern":
+    """Whole-word regex for a command keyword, compiled once per keyword."""
+    flags = re.UNICODE | (re.IGNORECASE if ignore_case else 0)
+    return re.compile(r"(?<!\w)" + re.escape(keyword) + r"(?!\w)", flags)
+
+
 def _strip_keywords(text: str, keywords: List[str]) -> str:
     """Remove command keywords (whole words) from text."""
     result = text
     for kw in sorted(keywords, key=len, reverse=True):
-        result = re.sub(r"(?<!\w)" + re.escape(kw) + r"(?!\w)", " ", result, flags=re.IGNORECASE | re.UNICODE)
-    return re.sub(r"\s+", " ", result).strip()
+        result = _keyword_regex(kw, True).sub(" ", result)
+    return _WHITESPACE_RE.sub(" ", result).strip()
 
 
 def _contains_keyword(text_lower: str, keywords: List[str]) -> bool:
-    return any(re.search(r"(?<!\w)" + re.escape(kw) + r"(?!\w)", text_lower, flags=re.UNICODE) for kw in keywords)
+    return any(_keyword_regex(kw).search(text_lower) for kw in keywords)
 
 
 def _normalized_item_name(item: Dict, lang: str) -> str:
@@ -2408,7 +2881,7 @@ def detect_voice_list_command(text: str, lang: str) -> Optional[Dict[str, Any]]:
     """
     if not text:
         return None
-    lang = lang if lang in ("ru", "uz") else "ru"
+    lang = lang if lang in SUPPORTED_LANGUAGES else "ru"
     lowered = text.lower()
 
     # Replace must be checked first ("замени X на Y" also contains a target product).
@@ -2534,6 +3007,10 @@ _BAZAAR_STOP_WORDS = {
 }
 
 _BAZAAR_NUMBER_RE = re.compile(r"^\d+(?:[.,]\d+)?$")
+_BAZAAR_THOUSAND_GROUP_RE = re.compile(r"\d{3}")
+_BAZAAR_SEGMENT_SPLIT_RE = re.compile(r"[,;.!?\n]+")
+_BAZAAR_TOKEN_RE = re.compile(r"\d+(?:[.,]\d+)?|[\w'’-]+", re.UNICODE)
+_BAZAAR_PUNCT_RE = re.compile(r"[^\w\s'’]", re.UNICODE)
 
 
 def _bazaar_normalize_price(value: float, has_thousand: bool, has_million: bool) -> int:
@@ -2549,8 +3026,8 @@ def _bazaar_normalize_price(value: float, has_thousand: bool, has_million: bool)
 
 def detect_bazaar_finish(text: str, lang: str) -> bool:
     """True when the utterance is a "shopping done / save the list" command."""
-    lowered = re.sub(r"[^\w\s'’]", " ", (text or "").lower(), flags=re.UNICODE)
-    lowered = re.sub(r"\s+", " ", lowered).strip()
+    lowered = _BAZAAR_PUNCT_RE.sub(" ", (text or "").lower())
+    lowered = _WHITESPACE_RE.sub(" ", lowered).strip()
     if not lowered:
         return False
     other = "uz" if lang == "ru" else "ru"
@@ -2570,12 +3047,12 @@ def parse_bazaar_purchases(text: str, lang: str = "ru") -> List[Dict[str, Any]]:
     """
     if not text:
         return []
-    lang = lang if lang in ("ru", "uz") else "ru"
+    lang = lang if lang in SUPPORTED_LANGUAGES else "ru"
     converted = _convert_number_words(text)
     purchases: List[Dict[str, Any]] = []
 
-    for segment in re.split(r"[,;.!?\n]+", converted):
-        tokens = re.findall(r"\d+(?:[.,]\d+)?|[\w'’-]+", segment, flags=re.UNICODE)
+    for segment in _BAZAAR_SEGMENT_SPLIT_RE.split(converted):
+        tokens = _BAZAAR_TOKEN_RE.findall(segment)
         name_tokens: List[str] = []
         i = 0
         while i < len(tokens):
@@ -2585,7 +3062,7 @@ def parse_bazaar_purchases(text: str, lang: str = "ru") -> List[Dict[str, Any]]:
                 value_str = tok
                 j = i + 1
                 while ("." not in value_str and "," not in value_str
-                       and j < len(tokens) and re.fullmatch(r"\d{3}", tokens[j])):
+                       and j < len(tokens) and _BAZAAR_THOUSAND_GROUP_RE.fullmatch(tokens[j])):
                     value_str += tokens[j]
                     j += 1
                 # A number right before a measurement unit is a quantity ("2 кг"),
@@ -2649,7 +3126,7 @@ async def extract_bazaar_purchases_gpt(text: str, lang: str) -> Optional[Dict[st
     if not _is_openai_available():
         return None
     try:
-        completion = client.chat.completions.create(
+        completion = await async_client.chat.completions.create(
             model=Config.CHAT_MODEL,
             messages=[
                 {"role": "system", "content": BAZAAR_GPT_PROMPT.get(lang, BAZAAR_GPT_PROMPT["ru"])},
@@ -2657,7 +3134,7 @@ async def extract_bazaar_purchases_gpt(text: str, lang: str) -> Optional[Dict[st
             ],
             temperature=0.1,
         )
-        data = json.loads(completion.choices[0].message.content)
+        data = json_codec.loads(completion.choices[0].message.content)
         purchases = []
         for p in data.get("purchases", []):
             name = str(p.get("name") or "").strip()
@@ -2669,7 +3146,7 @@ async def extract_bazaar_purchases_gpt(text: str, lang: str) -> Optional[Dict[st
                 purchases.append({"name": name, "price": price})
         return {"finish": bool(data.get("finish")), "purchases": purchases}
     except Exception as e:
-        logger.error(f"Bazaar GPT extraction error: {e}")
+        logger.error("Bazaar GPT extraction error: %s", e)
         return None
 
 
@@ -2790,7 +3267,7 @@ async def process_bazaar_text(user_id: int, text: str, lang: str) -> Tuple[int,
     list_data = db.get_active_list(user_id)
     if not list_data:
         return 404, {"success": False, "error": "List not found"}
-    lang = lang if lang in ("ru", "uz") else "ru"
+    lang = lang if lang in SUPPORTED_LANGUAGES else "ru"
 
     # Tolerate a lost mode flag (e.g. list re-created mid-shopping).
     if not list_data.get("bazaar_mode"):
@@ -2819,7 +3296,30 @@ async def process_bazaar_text(user_id: int, text: str, lang: str) -> Tuple[int,
 
 def apply_edit_changes(categories: Dict[str, List[Dict]], changes: List[Dict], lang: str = "ru") -> Dict[
     str, List[Dict]]:
-    updated_categories = {k: [dict(item) for item in v] for k, v in categories.items()}
+    """Apply GPT/voice edit changes to the categories IN PLACE and return them.
+
+    Every caller assigns the result straight back into list_data["categories"],
+    so no copy of the categories and their items is made.
+    """
+    updated_categories = categories
+
+    # Consecutive removes commute, so a run of them is applied in one scan.
+    pending_removes: List[str] = []
+
+    def flush_removes():
+        if not pending_removes:
+            return
+        for cat_name in list(updated_categories.keys()):
+            updated_items = []
+            for item in updated_categories[cat_name]:
+                name_lower = item["name"].lower()
+                if not any(t in name_lower for t in pending_removes):
+                    updated_items.append(item)
+            if updated_items:
+                updated_categories[cat_name] = updated_items
+            else:
+                del updated_categories[cat_name]
+        pending_removes.clear()
 
     for change in changes:
         action = change.get("action")
@@ -2827,32 +3327,32 @@ def apply_edit_changes(categories: Dict[str, List[Dict]], changes: List[Dict], l
         new_item = (change.get("new_item") or "").strip()
         quantity = (change.get("quantity") or "").strip()
 
+        if action == "remove":
+            if target:
+                pending_removes.append(capitalize_first_letter(target).lower())
+            continue
+        flush_removes()
+
         if new_item:
             new_item = capitalize_first_letter(new_item)
         if target:
             target = capitalize_first_letter(target)
         if quantity:
             quantity = normalize_quantity_display(quantity, lang)
+        # Case-folded once per change, not once per scanned item.
+        target_lower = target.lower()
+        new_item_lower = new_item.lower()
 
         # Never introduce obscene / illegal / unsafe items via add/replace.
         if new_item and _is_blocked_product(new_item):
             if action in ("add", "replace", "update"):
                 continue
 
-        if action == "remove" and target:
-            for cat_name in list(updated_categories.keys()):
-                updated_items = [item for item in updated_categories[cat_name] if
-                                 target.lower() not in item["name"].lower()]
-                if updated_items:
-                    updated_categories[cat_name] = updated_items
-                else:
-                    del updated_categories[cat_name]
-
-        elif action == "add" and new_item:
+        if action == "add" and new_item:
             existing_found = False
             for items in updated_categories.values():
                 for item in items:
-                    if item["name"].lower() == new_item.lower():
+                    if item["name"].lower() == new_item_lower:
                         if quantity:
                             item["quantity"] = quantity
                             item["user_specified_quantity"] = True
@@ -2878,7 +3378,8 @@ def apply_edit_changes(categories: Dict[str, List[Dict]], changes: List[Dict], l
 
             for cat_name in list(updated_categories.keys()):
                 for i, item in enumerate(updated_categories[cat_name]):
-                    if target.lower() in item["name"].lower() or item["name"].lower() in target.lower():
+                    name_lower = item["name"].lower()
+                    if target_lower in name_lower or name_lower in target_lower:
                         target_found = True
                         target_cat = cat_name
                         target_idx = i
@@ -2898,7 +3399,7 @@ def apply_edit_changes(categories: Dict[str, List[Dict]], changes: List[Dict], l
 
                 existing_found = False
                 for item in updated_categories[target_category]:
-                    if item["name"].lower() == new_item.lower():
+                    if item["name"].lower() == new_item_lower:
                         if quantity:
                             item["quantity"] = quantity
                             item["user_specified_quantity"] = True
@@ -2915,12 +3416,16 @@ def apply_edit_changes(categories: Dict[str, List[Dict]], changes: List[Dict], l
         elif action == "update" and target and quantity:
             for items in updated_categories.values():
                 for item in items:
-                    if target.lower() in item["name"].lower() or item["name"].lower() in target.lower():
+                    name_lower = item["name"].lower()
+                    if target_lower in name_lower or name_lower in target_lower:
                         item["quantity"] = quantity
                         item["estimated_price"] = None
                         item["user_specified_quantity"] = True
+    flush_removes()
 
-    return {k: v for k, v in updated_categories.items() if v}
+    for empty_category in [k for k, v in updated_categories.items() if not v]:
+        del updated_categories[empty_category]
+    return updated_categories
 
 
 # ===== VOICE TRANSCRIPTION =====
@@ -2941,69 +3446,113 @@ VOICE_COMING_SOON_MESSAGE = {
 }
 
 
-async def transcribe_voice(file_path: str, lang: str = "ru") -> Optional[str]:
-    """Transcribe a voice recording with OpenAI Whisper, forcing the target language."""
+async def transcribe_voice(audio: bytes, filename: str, lang: str = "ru") -> Optional[str]:
+    """Transcribe a voice recording with OpenAI Whisper, forcing the target language.
+
+    The upload is sent straight from memory; the filename's extension tells
+    Whisper the container format, so no temp file is written.
+    """
     if not _is_openai_available():
         logger.info("No transcription backend available (OPENAI_API_KEY missing)")
         return None
 
-    logger.info(f"Whisper transcription start: file={file_path}, lang={lang}")
-
-    def _do_transcribe() -> Optional[str]:
-        with open(file_path, "rb") as audio_file:
-            response = client.audio.transcriptions.create(
-                model=Config.STT_MODEL,
-                file=audio_file,
-                language=lang,
-                prompt=WHISPER_PROMPTS.get(lang, ""),
-                temperature=0,
-            )
-        return getattr(response, "text", None)
+    logger.info("Whisper transcription start: file=%s, lang=%s", filename, lang)
 
-    text = await asyncio.to_thread(_do_transcribe)
-    logger.info(f"Whisper transcription end: file={file_path}, chars={len(text) if text else 0}")
+    response = await async_client.audio.transcriptions.create(
+        model=Config.STT_MODEL,
+        file=(filename, audio),
+        language=lang,
+        prompt=WHISPER_PROMPTS.get(lang, ""),
+        temperature=0,
+    )
+    text = getattr(response, "text", None)
+    logger.info("Whisper transcription end: file=%s, chars=%s", filename, len(text) if text else 0)
     return text
 
 
 # ===== WEBSOCKET MANAGER =====
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[int, WebSocket] = {}
+        # Weak values: once a socket's endpoint coroutine is gone the entry
+        # disappears by itself, even if disconnect() was never reached.
+        self.active_connections: "weakref.WeakValueDictionary[int, WebSocket]" = weakref.WeakValueDictionary()
+        # Per-user outgoing buffer for queue_message() and its pending flush timer.
+        self.pending_messages: Dict[int, List[dict]] = {}
+        self.flush_handles: Dict[int, asyncio.TimerHandle] = {}
+        self._flush_tasks = set()
 
     async def connect(self, user_id: int, websocket: WebSocket):
         await websocket.accept()
         self.active_connections[user_id] = websocket
 
-    def disconnect(self, user_id: int):
-        if user_id in self.active_connections:
+    def disconnect(self, user_id: int, websocket: Optional[WebSocket] = None):
+        """Forget user_id's socket. With websocket given, only while it is still
+        the registered one, so a stale socket closing cannot evict a reconnect."""
+        current = self.active_connections.get(user_id)
+        if current is not None and (websocket is None or current is websocket):
             del self.active_connections[user_id]
+            self.pending_messages.pop(user_id, None)
+            handle = self.flush_handles.pop(user_id, None)
+            if handle:
+                handle.cancel()
+
+    def queue_message(self, user_id: int, message: dict):
+        """Buffer a message and send it with whatever else arrives within
+        Config.WS_BATCH_DELAY_MS, as a single {"type": "batch"} frame."""
+        if user_id not in self.active_connections:
+            return
+        pending = self.pending_messages.setdefault(user_id, [])
+        pending.append(message)
+        if len(pending) >= Config.WS_BATCH_MAX_MESSAGES:
+            self._start_flush(user_id)
+        elif user_id not in self.flush_handles:
+            self.flush_handles[user_id] = asyncio.get_running_loop().call_later(
+                Config.WS_BATCH_DELAY_MS / 1000, self._start_flush, user_id)
+
+    def _start_flush(self, user_id: int):
+        task = asyncio.create_task(self.flush(user_id))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self, user_id: int):
+        """Send the user's buffered messages now (one frame; a lone message unwrapped)."""
+        handle = self.flush_handles.pop(user_id, None)
+        if handle:
+            handle.cancel()
+        messages = self.pending_messages.pop(user_id, None)
+        if not messages:
+            return
+        payload = messages[0] if len(messages) == 1 else {"type": "batch", "items": messages}
+        await self.send_personal_message(user_id, payload)
 
     async def send_personal_message(self, user_id: int, message: dict):
-        if user_id in self.active_connections:
-            try:
-                await self.active_connections[user_id].send_json(message)
-            except:
-                self.disconnect(user_id)
+        await self.send_personal_text(user_id, json_codec.dumps(message))
+
+    async def send_personal_text(self, user_id: int, payload: str):
+        """Send an already-encoded JSON frame (e.g. a module-level constant)."""
+        websocket = self.active_connections.get(user_id)
+        if websocket is None:
+            return
+        try:
+            await websocket.send_text(payload)
+        except (WebSocketDisconnect, RuntimeError, OSError):
+            self.disconnect(user_id, websocket)
 
 
 ws_manager = ConnectionManager()
 
+# Fixed frames are encoded once at import instead of per message.
+WS_PONG_FRAME = json_codec.dumps({"type": "pong"})
+
 
 # ===== HELPER FUNCTIONS FOR DATABASE-BASED LIST MANAGEMENT =====
 def recalculate_list_totals(list_data: Dict) -> Dict:
     """Recalculate totals for a shopping list"""
     categories = list_data.get("categories", {})
-    total_items = 0
-    purchased_items = 0
-    total_estimated_price = 0
-
-    for category, items in categories.items():
-        for item in items:
-            total_items += 1
-            if item.get("purchased", False):
-                purchased_items += 1
-            if item.get("estimated_price"):
-                total_estimated_price += item.get("estimated_price", 0)
+    all_items = [item for items in categories.values() for item in items]
+    total_items = len(all_items)
+    purchased_items = sum(1 for item in all_items if item.get("purchased", False))
+    total_estimated_price = sum(filter(None, (item.get("estimated_price") for item in all_items)))
 
     list_data["total_items"] = total_items
     list_data["purchased_items"] = purchased_items
@@ -3028,24 +3577,10 @@ def recalculate_list_prices(list_data: Dict, lang: str) -> Dict:
             if not original_name:
                 continue
 
-            matches = price_db.find_products(original_name, lang)
-            if not matches:
+            quote = _quote_list_item(original_name, item.get("quantity", ""), lang, fallback_to_first=True)
+            if quote is None:
                 continue
-
-            best_match = price_db.choose_best_product_match(
-                matches,
-                original_name,
-                lang,
-                requested_quantity_text=item.get("quantity", "")
-            ) or matches[0]
-            price, normalized_qty, user_specified = price_db.calculate_price_for_product(
-                best_match,
-                item.get("quantity", ""),
-                lang
-            )
-            # Same confidence gate as list creation: no price beats a wrong price.
-            confidence = _score_match_confidence(original_name, best_match, lang)
-            item["estimated_price"] = price if confidence >= MATCH_CONFIDENCE_THRESHOLD else None
+            item["estimated_price"], normalized_qty, user_specified = quote
 
             if user_specified:
                 item["quantity"] = normalized_qty
@@ -3060,13 +3595,34 @@ def toggle_item_purchased_in_list(list_data: Dict, category: str, item_name: str
     """Toggle purchased status of a single item in list data"""
     categories = list_data.get("categories", {})
 
+    toggled = None
     if category in categories:
         for item in categories[category]:
             if item["name"] == item_name:
-                item["purchased"] = not item.get("purchased", False)
+                item["purchased"] = toggled = not item.get("purchased", False)
                 break
 
-    list_data = recalculate_list_totals(list_data)
+    if toggled is None:
+        return recalculate_list_totals(list_data)
+    return _shift_purchased_count(list_data, 1 if toggled else -1)
+
+
+def _shift_purchased_count(list_data: Dict, delta: int) -> Dict:
+    """Patch the purchased counters after `delta` items changed state.
+
+    A toggle changes only the purchased counter, so it is adjusted instead of
+    re-walking the whole list; a full recount is the fallback when the stored
+    counters are missing.
+    """
+    total_items = list_data.get("total_items")
+    purchased_items = list_data.get("purchased_items")
+    if not isinstance(total_items, int) or not isinstance(purchased_items, int):
+        return recalculate_list_totals(list_data)
+
+    purchased_items = min(max(purchased_items + delta, 0), total_items)
+    list_data["purchased_items"] = purchased_items
+    list_data["all_purchased"] = (total_items > 0 and purchased_items == total_items)
+    list_data["needs_confirmation"] = list_data["all_purchased"]
     return list_data
 
 
@@ -3085,12 +3641,14 @@ def toggle_category_purchased_in_list(list_data: Dict, category: str) -> Dict:
     all_purchased = all(item.get("purchased", False) for item in category_items)
     new_purchased_status = not all_purchased
 
-    # Toggle all items in category
+    # Toggle all items in category, counting the ones that actually flip
+    flipped = 0
     for item in category_items:
+        if bool(item.get("purchased", False)) != new_purchased_status:
+            flipped += 1
         item["purchased"] = new_purchased_status
 
-    list_data = recalculate_list_totals(list_data)
-    return list_data
+    return _shift_purchased_count(list_data, flipped if new_purchased_status else -flipped)
 
 
 def update_item_in_list(list_data: Dict, category: str, old_item_name: str, new_item_name: str, new_quantity: str,
@@ -3205,22 +3763,51 @@ def merge_categories_into_list(list_data: Dict, new_categories: Dict[str, List[D
     return list_data
 
 
+def _build_list_from_gpt_text(response_text: str, user_id: int, lang: str, original_text: str,
+                              list_data: Optional[Dict]) -> Optional[Dict]:
+    """Parse a GPT-formatted list and price it, merged into list_data when there is one.
+
+    Returns None (leaving list_data untouched) if the text holds no list. This is
+    pure CPU work, so chat_message runs it in one asyncio.to_thread hop.
+    """
+    categories = parse_shopping_list(response_text, lang)
+    if not categories:
+        return None
+    if list_data:
+        return merge_categories_into_list(list_data, categories, lang)
+    return format_shopping_list_for_json(categories, user_id, lang, original_text=original_text)
+
+
 # ===== FASTAPI LIFESPAN =====
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting Bozorlik AI Backend...")
 
+    # Open pooled DB connections before serving, so the first requests do
+    # not each pay a connection handshake.
+    try:
+        warmed = await asyncio.to_thread(db.warm_pool)
+        logger.info("Warmed %s database connections", warmed)
+    except Exception as e:
+        logger.error("Error warming database pool: %s", e)
+
     # Cleanup expired shared lists on startup
     try:
         deleted = shared_list_service.cleanup_expired()
         if deleted > 0:
-            logger.info(f"Cleaned up {deleted} expired shared lists")
+            logger.info("Cleaned up %s expired shared lists", deleted)
     except Exception as e:
-        logger.error(f"Error cleaning expired shared lists: {e}")
+        logger.error("Error cleaning expired shared lists: %s", e)
 
     yield
 
     logger.info("Shutting down Bozorlik AI Backend...")
+    # The HTTP client and the DB pool close independently; overlap them.
+    results = await asyncio.gather(close_http_session(), asyncio.to_thread(db.close),
+                                   return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error("Error during shutdown: %s", result)
     logger.info("Shutdown complete")
 
 
@@ -3229,7 +3816,8 @@ app = FastAPI(
     title="Bozorlik AI Web Backend",
     description="Web интерфейс для Telegram бота Bozorlik AI",
     version="5.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=JSONResponse,
 )
 
 if Config.CORS_ALLOWED_ORIGINS.strip() == "*":
@@ -3259,7 +3847,7 @@ app.add_middleware(
 async def root():
     # Telegram WebView агрессивно кеширует HTML: без no-store пользователи после
     # деплоя продолжают видеть старую версию мини-приложения.
-    return HTMLResponse(content=render_shared_page_html(""),
+    return HTMLResponse(content=_index_html()[1],
                         headers={"Cache-Control": "no-store"})
 
 
@@ -3268,6 +3856,16 @@ async def health_check():
     return JSONResponse(content={"status": "healthy", "timestamp": datetime.now().isoformat()})
 
 
+@app.get("/health/db")
+async def health_db():
+    """DB pool stats for monitoring; always 200 so load balancers never drop an
+    instance over it. held_too_long > 0 (connections out longer than
+    DB_LEAK_SECONDS) or a lasting "saturated" points at a leak; a "connects"
+    count climbing faster than DB_POOL_RECYCLE explains means connections are
+    cycled instead of reused."""
+    return JSONResponse(content={"status": "ok", "pool": db.get_pool_stats()})
+
+
 # Serve static image/asset files (logos, icons) referenced by index.html.
 _STATIC_ASSET_EXTS = {".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico"}
 
@@ -3295,7 +3893,7 @@ async def get_active_list(user_id: int):
         else:
             return JSONResponse(content={"success": True, "data": None})
     except Exception as e:
-        logger.error(f"Get active list error: {e}", exc_info=True)
+        logger.error("Get active list error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -3307,7 +3905,7 @@ async def quick_add_item(request: QuickAddRequest):
         quantity = request.quantity.strip()
         lang = request.language
 
-        logger.info(f"Quick add: user={user_id}, name={name}, qty={quantity}")
+        logger.info("Quick add: user=%s, name=%s, qty=%s", user_id, name, quantity)
 
         if not name:
             return JSONResponse(status_code=400, content={"success": False, "error": "Empty product name"})
@@ -3350,7 +3948,7 @@ async def quick_add_item(request: QuickAddRequest):
 
             return JSONResponse(content={"success": True, "type": "shopping_list", "data": list_data, "added": True})
     except Exception as e:
-        logger.error(f"Quick add error: {e}", exc_info=True)
+        logger.error("Quick add error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -3362,7 +3960,7 @@ async def chat_message(chat_request: ChatMessage):
         lang = chat_request.language
         is_quick_add = chat_request.is_quick_add
 
-        logger.info(f"Chat: user={user_id}, text={text[:50]}")
+        logger.info("Chat: user=%s, text=%s", user_id, text[:50])
 
         if not text:
             return JSONResponse(status_code=400, content={"success": False, "error": "Empty message"})
@@ -3456,9 +4054,8 @@ async def chat_message(chat_request: ChatMessage):
             response_text = "Привет! Что нужно купить сегодня?" if lang == "ru" else "Salom! Bugun nima xarid qilish kerak?"
             return JSONResponse(content={"success": True, "type": "message", "message": response_text})
 
-        add_keywords_ru = ["добавь", "добавить", "прибавь", "ещё", "плюс"]
-        add_keywords_uz = ["qo'sh", "qo'shing", "yana", "plus"]
-        is_add_command = any(word in text.lower() for word in (add_keywords_ru if lang == "ru" else add_keywords_uz))
+        add_keywords = EDIT_ADD_KEYWORDS["ru" if lang == "ru" else "uz"]
+        is_add_command = any(word in text.lower() for word in add_keywords)
 
         if list_data and is_add_command:
             changes = await detect_edit_changes(text, lang)
@@ -3474,12 +4071,16 @@ async def chat_message(chat_request: ChatMessage):
                     content={"success": True, "type": "shopping_list", "data": list_data, "added": True})
             else:
                 add_text = text
-                for word in (add_keywords_ru if lang == "ru" else add_keywords_uz):
+                for word in add_keywords:
                     add_text = re.sub(rf'\b{word}\b', '', add_text, flags=re.IGNORECASE).strip()
 
                 if add_text:
-                    add_response = await format_list_with_gpt(add_text, lang)
-                    add_categories = parse_shopping_list(add_response, lang)
+                    # Keyword-stripped text is often a plain product list now; parse it
+                    # locally and only pay for GPT when the deterministic parser gives up.
+                    add_categories = try_parse_direct_shopping_input(add_text, lang)
+                    if not add_categories:
+                        add_response = await format_list_with_gpt(add_text, lang)
+                        add_categories = parse_shopping_list(add_response, lang)
                     list_data = merge_categories_into_list(list_data, add_categories, lang)
                     db.save_active_list(user_id, list_data)
                     return JSONResponse(
@@ -3504,20 +4105,22 @@ async def chat_message(chat_request: ChatMessage):
                         content={"success": True, "type": "shopping_list", "data": list_data, "edited": True,
                                  "message": "Список обновлен"})
 
-        response_text = await format_list_with_gpt(text, lang)
-
-        categories = parse_shopping_list(response_text, lang)
-        if categories:
-
+        # Connected clients get the list line by line while GPT is still writing it.
+        stream_to_ws = None
+        if user_id in ws_manager.active_connections:
+            async def stream_to_ws(line: str):
+                ws_manager.queue_message(user_id, {"type": "list_stream", "line": line})
+        response_text = await format_list_with_gpt(text, lang, on_line=stream_to_ws)
+        if stream_to_ws:
+            await ws_manager.flush(user_id)
+
+        parsed_list = await asyncio.to_thread(_build_list_from_gpt_text, response_text, user_id, lang, text, list_data)
+        if parsed_list is not None:
+            db.save_active_list(user_id, parsed_list)
             if list_data:
-                list_data = merge_categories_into_list(list_data, categories, lang)
-                db.save_active_list(user_id, list_data)
                 return JSONResponse(
-                    content={"success": True, "type": "shopping_list", "data": list_data, "added": True})
-            else:
-                list_json = format_shopping_list_for_json(categories, user_id, lang, original_text=text)
-                db.save_active_list(user_id, list_json)
-                return JSONResponse(content={"success": True, "type": "shopping_list", "data": list_json})
+                    content={"success": True, "type": "shopping_list", "data": parsed_list, "added": True})
+            return JSONResponse(content={"success": True, "type": "shopping_list", "data": parsed_list})
         else:
             if list_data:
                 fallback_changes = await detect_edit_changes(text, lang)
@@ -3533,7 +4136,7 @@ async def chat_message(chat_request: ChatMessage):
 
             return JSONResponse(content={"success": True, "type": "message", "message": response_text})
     except Exception as e:
-        logger.error(f"Chat error: {e}", exc_info=True)
+        logger.error("Chat error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -3571,89 +4174,78 @@ async def recipe_shopping_list(request: RecipeListRequest):
 
         return JSONResponse(content=response)
     except Exception as e:
-        logger.error(f"Recipe list error: {e}", exc_info=True)
+        logger.error("Recipe list error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
 async def _read_and_transcribe_voice(voice_file: UploadFile, language: str) -> Tuple[Optional[str], Optional[JSONResponse]]:
-    """Validate an uploaded audio file, transcribe it and clean up the temp file.
+    """Validate an uploaded audio file and transcribe it.
 
     Returns (text, None) on success or (None, error_response) on failure.
     """
-    temp_file = None
-    try:
-        allowed_content_types = {
-            "audio/ogg", "audio/oga", "audio/mpeg", "audio/mp3", "audio/wav", "audio/x-wav",
-            "audio/mp4", "audio/webm", "audio/x-m4a", "audio/aac", "audio/x-aac"
-        }
-        allowed_extensions = {".ogg", ".oga", ".mp3", ".wav", ".m4a", ".mp4", ".webm", ".aac"}
-
-        raw_content_type = (voice_file.content_type or "").lower().strip()
-        normalized_content_type = raw_content_type.split(";", 1)[0].strip() if raw_content_type else ""
-        file_name = (voice_file.filename or "voice.ogg").lower()
-        file_ext = os.path.splitext(file_name)[1]
-
-        content_type_ok = normalized_content_type in allowed_content_types if normalized_content_type else False
-        extension_ok = file_ext in allowed_extensions if file_ext else False
-
-        # Some browsers/senders provide codec parameters or generic MIME types.
-        # Accept when either MIME or file extension indicates a supported audio format.
-        if not content_type_ok and not extension_ok:
-            return None, JSONResponse(status_code=400, content={"success": False, "error": "Unsupported audio format"})
-
-        # Save to temp file with extension close to the original format.
-        suffix = file_ext if extension_ok else '.ogg'
-        if not suffix:
-            suffix = '.ogg'
-
-        if normalized_content_type == 'audio/webm':
-            suffix = '.webm'
-        elif normalized_content_type in {'audio/mp4', 'audio/x-m4a'}:
-            suffix = '.m4a'
-        elif normalized_content_type in {'audio/wav', 'audio/x-wav'}:
-            suffix = '.wav'
-        elif normalized_content_type in {'audio/mpeg', 'audio/mp3'}:
-            suffix = '.mp3'
-        elif normalized_content_type in {'audio/aac', 'audio/x-aac'}:
-            suffix = '.aac'
-        content = await voice_file.read()
-        if not content:
-            return None, JSONResponse(status_code=400, content={"success": False, "error": "Empty audio file"})
-
-        max_bytes = _voice_max_size_bytes()
-        if len(content) > max_bytes:
-            return None, JSONResponse(
-                status_code=413,
-                content={
-                    "success": False,
-                    "error": f"Audio file is too large. Max size is {Config.MAX_VOICE_FILE_SIZE_MB} MB"
-                }
-            )
-
-        logger.info(f"Voice upload: filename={file_name}, content_type={raw_content_type}, normalized={normalized_content_type}, suffix={suffix}, bytes={len(content)}")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as f:
-            f.write(content)
-            temp_file = f.name
+    allowed_content_types = {
+        "audio/ogg", "audio/oga", "audio/mpeg", "audio/mp3", "audio/wav", "audio/x-wav",
+        "audio/mp4", "audio/webm", "audio/x-m4a", "audio/aac", "audio/x-aac"
+    }
+    allowed_extensions = {".ogg", ".oga", ".mp3", ".wav", ".m4a", ".mp4", ".webm", ".aac"}
+
+    raw_content_type = (voice_file.content_type or "").lower().strip()
+    normalized_content_type = raw_content_type.split(";", 1)[0].strip() if raw_content_type else ""
+    file_name = (voice_file.filename or "voice.ogg").lower()
+    file_ext = os.path.splitext(file_name)[1]
+
+    content_type_ok = normalized_content_type in allowed_content_types if normalized_content_type else False
+    extension_ok = file_ext in allowed_extensions if file_ext else False
+
+    # Some browsers/senders provide codec parameters or generic MIME types.
+    # Accept when either MIME or file extension indicates a supported audio format.
+    if not content_type_ok and not extension_ok:
+        return None, JSONResponse(status_code=400, content={"success": False, "error": "Unsupported audio format"})
+
+    # Upload name with an extension close to the original format.
+    suffix = file_ext if extension_ok else '.ogg'
+    if not suffix:
+        suffix = '.ogg'
+
+    if normalized_content_type == 'audio/webm':
+        suffix = '.webm'
+    elif normalized_content_type in {'audio/mp4', 'audio/x-m4a'}:
+        suffix = '.m4a'
+    elif normalized_content_type in {'audio/wav', 'audio/x-wav'}:
+        suffix = '.wav'
+    elif normalized_content_type in {'audio/mpeg', 'audio/mp3'}:
+        suffix = '.mp3'
+    elif normalized_content_type in {'audio/aac', 'audio/x-aac'}:
+        suffix = '.aac'
+    content = await voice_file.read()
+    if not content:
+        return None, JSONResponse(status_code=400, content={"success": False, "error": "Empty audio file"})
+
+    max_bytes = _voice_max_size_bytes()
+    if len(content) > max_bytes:
+        return None, JSONResponse(
+            status_code=413,
+            content={
+                "success": False,
+                "error": f"Audio file is too large. Max size is {Config.MAX_VOICE_FILE_SIZE_MB} MB"
+            }
+        )
 
-        try:
-            text = await transcribe_voice(temp_file, language)
-        except Exception as e:
-            logger.error(f"Transcription error for file {temp_file}: {e}", exc_info=True)
-            return None, JSONResponse(status_code=500,
-                                      content={"success": False, "error": "Transcription failed", "detail": str(e)})
+    logger.info("Voice upload: filename=%s, content_type=%s, normalized=%s, suffix=%s, bytes=%s",
+                file_name, raw_content_type, normalized_content_type, suffix, len(content))
+    try:
+        text = await transcribe_voice(content, f"voice{suffix}", language)
+    except Exception as e:
+        logger.error("Transcription error for file %s: %s", file_name, e, exc_info=True)
+        return None, JSONResponse(status_code=500,
+                                  content={"success": False, "error": "Transcription failed", "detail": str(e)})
 
-        if not text:
-            error_msg = "Не удалось распознать голос" if language == "ru" else "Ovozni tanishib bo'lmadi"
-            return None, JSONResponse(status_code=400, content={"success": False, "error": error_msg})
+    if not text:
+        error_msg = "Не удалось распознать голос" if language == "ru" else "Ovozni tanishib bo'lmadi"
+        return None, JSONResponse(status_code=400, content={"success": False, "error": error_msg})
 
-        logger.info(f"Transcribed: {text[:100]}")
-        return text, None
-    finally:
-        if temp_file and os.path.exists(temp_file):
-            try:
-                os.remove(temp_file)
-            except:
-                pass
+    logger.info("Transcribed: %s", text[:100])
+    return text, None
 
 
 @app.post("/api/voice")
@@ -3663,9 +4255,9 @@ async def voice_message(
         voice_file: UploadFile = File(...)
 ):
     try:
-        logger.info(f"Voice: user={user_id}, lang={language}")
+        logger.info("Voice: user=%s, lang=%s", user_id, language)
 
-        if language not in ["ru", "uz"]:
+        if language not in SUPPORTED_LANGUAGES:
             return JSONResponse(status_code=400, content={"success": False, "error": "Unsupported language"})
 
         # Uzbek voice input is temporarily unavailable (Aisha STT removed);
@@ -3688,12 +4280,12 @@ async def voice_message(
         )
 
         response = await chat_message(chat_request)
-        response_data = json.loads(response.body)
+        response_data = json_codec.loads(response.body)
         response_data["transcribed_text"] = text
 
         return JSONResponse(content=response_data)
     except Exception as e:
-        logger.error(f"Voice error: {e}", exc_info=True)
+        logger.error("Voice error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -3739,9 +4331,9 @@ async def photo_message(
     same pipeline as a typed/voice message (deterministic parser + chat model).
     """
     try:
-        logger.info(f"Photo: user={user_id}, lang={language}")
+        logger.info("Photo: user=%s, lang=%s", user_id, language)
 
-        if language not in ["ru", "uz"]:
+        if language not in SUPPORTED_LANGUAGES:
             return JSONResponse(status_code=400, content={"success": False, "error": "Unsupported language"})
 
         if not _is_openai_available():
@@ -3773,23 +4365,20 @@ async def photo_message(
         mime = content_type if content_type in _ALLOWED_PHOTO_TYPES else "image/jpeg"
         data_url = f"data:{mime};base64,{base64.b64encode(content).decode('ascii')}"
 
-        def _do_ocr() -> str:
-            completion = client.chat.completions.create(
-                model=Config.OCR_MODEL,
-                messages=[
-                    {"role": "system", "content": PHOTO_OCR_SYSTEM_PROMPT},
-                    {"role": "user", "content": [
-                        {"type": "text",
-                         "text": "Распознай список покупок на фото и верни его текстом построчно."},
-                        {"type": "image_url", "image_url": {"url": data_url, "detail": "high"}},
-                    ]},
-                ],
-                temperature=0,
-                max_tokens=700,
-            )
-            return (completion.choices[0].message.content or "").strip()
-
-        recognized = await asyncio.to_thread(_do_ocr)
+        completion = await async_client.chat.completions.create(
+            model=Config.OCR_MODEL,
+            messages=[
+                {"role": "system", "content": PHOTO_OCR_SYSTEM_PROMPT},
+                {"role": "user", "content": [
+                    {"type": "text",
+                     "text": "Распознай список покупок на фото и верни его текстом построчно."},
+                    {"type": "image_url", "image_url": {"url": data_url, "detail": "high"}},
+                ]},
+            ],
+            temperature=0,
+            max_tokens=700,
+        )
+        recognized = (completion.choices[0].message.content or "").strip()
         recognized_text = _clean_recognized_list_text(recognized or "")
 
         if not recognized_text:
@@ -3798,26 +4387,26 @@ async def photo_message(
                          else "Fotodagi xaridlar ro'yxatini aniqlab bo'lmadi")
             return JSONResponse(status_code=400, content={"success": False, "error": error_msg})
 
-        logger.info(f"Photo OCR result: {recognized_text[:120]}")
+        logger.info("Photo OCR result: %s", recognized_text[:120])
 
         chat_request = ChatMessage(
             user_id=user_id, text=recognized_text, language=language,
             is_voice=False, is_quick_add=False
         )
         response = await chat_message(chat_request)
-        response_data = json.loads(response.body)
+        response_data = json_codec.loads(response.body)
         response_data["recognized_text"] = recognized_text
 
         return JSONResponse(content=response_data)
     except Exception as e:
-        logger.error(f"Photo error: {e}", exc_info=True)
+        logger.error("Photo error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
 # ===== PREMIUM: RECEIPT SCANNING (Analytics page) =====
 # GPT-4.1 Vision does ALL recognition work — no regex parsing, no manual OCR.
 # Pipeline: analyze_receipt_image() -> normalize_receipt() -> categorize_items()
-#           -> save_receipt() -> save_purchase_history() -> update_analytics()
+#           -> save_receipt() (receipt + purchase history) -> update_analytics()
 # Only already-processed structured data is persisted. Purchase history is kept
 # per item so future features (repeat purchases, "buy again", "what I usually
 # buy", AI recommendations, personal analytics) can build on it directly.
@@ -3914,7 +4503,7 @@ def analyze_receipt_image(image_bytes: bytes, mime: str) -> Optional[Dict[str, A
         response_format={"type": "json_object"},
     )
     raw = (completion.choices[0].message.content or "").strip()
-    data = json.loads(raw)
+    data = json_codec.loads(raw)
     if not isinstance(data, dict) or data.get("error") or not data.get("items"):
         return None
     return data
@@ -4198,14 +4787,14 @@ def _translate_names_gpt(names: List[str], src_lang: str, dst_lang: str) -> Dict
             model=Config.CHAT_MODEL,
             messages=[
                 {"role": "system", "content": system},
-                {"role": "user", "content": json.dumps(chunk, ensure_ascii=False)},
+                {"role": "user", "content": json_codec.dumps(chunk)},
             ],
             temperature=0,
             max_tokens=4000,
             response_format={"type": "json_object"},
         )
         try:
-            data = json.loads((completion.choices[0].message.content or "").strip())
+            data = json_codec.loads((completion.choices[0].message.content or "").strip())
             if isinstance(data, dict):
                 for key, value in data.items():
                     if isinstance(value, str) and value.strip():
@@ -4239,7 +4828,7 @@ def translate_product_names(names: List[str], src_lang: str, dst_lang: str) -> D
         try:
             gpt_map = _translate_names_gpt(pending, src_lang, dst_lang)
         except Exception as e:
-            logger.error(f"GPT name translation error: {e}")
+            logger.error("GPT name translation error: %s", e)
             gpt_map = {}
         for name in pending:
             translated = capitalize_first_letter((gpt_map.get(name) or "").strip())
@@ -4291,11 +4880,14 @@ def _translate_user_content(user_id: int, src_lang: str, dst_lang: str) -> bool:
     list, saved history lists, and backfill missing bilingual names on scanned
     receipts / purchase history. Runs when the user switches the interface
     language, so products never stay in the previous language."""
-    if src_lang == dst_lang or dst_lang not in ("ru", "uz"):
+    if src_lang == dst_lang or dst_lang not in SUPPORTED_LANGUAGES:
         return False
 
-    active_list = db.get_active_list(user_id)
-    history_entries = db.get_user_history_raw(user_id)
+    # Each run of DB calls shares one pooled connection; the translation
+    # requests in between run with no connection held.
+    with db.connection():
+        active_list = db.get_active_list(user_id)
+        history_entries = db.get_user_history_raw(user_id)
 
     names = set()
     if active_list:
@@ -4304,28 +4896,31 @@ def _translate_user_content(user_id: int, src_lang: str, dst_lang: str) -> bool:
         names |= _collect_list_names(entry_data)
     name_map = translate_product_names(sorted(names), src_lang, dst_lang) if names else {}
 
-    if active_list:
-        db.save_active_list(user_id, translate_list_data(active_list, dst_lang, name_map))
-    for list_id, entry_data in history_entries:
-        db.update_history_entry(user_id, list_id, translate_list_data(entry_data, dst_lang, name_map))
+    with db.connection():
+        if active_list:
+            db.save_active_list(user_id, translate_list_data(active_list, dst_lang, name_map))
+        db.update_history_entries(user_id, {list_id: translate_list_data(entry_data, dst_lang, name_map)
+                                            for list_id, entry_data in history_entries})
 
     # Receipts/purchases store canonical Russian + bilingual names and are
     # localized at read time; here we only backfill name_uz for items scanned
     # before bilingual storage existed.
     if dst_lang == "uz":
         missing = set()
-        receipts = db.get_user_receipts(user_id)
+        with db.connection():
+            receipts = db.get_user_receipts(user_id)
+            purchases = db.get_purchase_history(user_id, limit=1000)
         for receipt in receipts:
             for item in receipt.get("items", []):
                 if not (item.get("name_uz") or "").strip():
                     missing.add((item.get("name_ru") or item.get("name") or "").strip())
-        purchases = db.get_purchase_history(user_id, limit=1000)
         for row in purchases:
             if not (row.get("name_uz") or "").strip():
                 missing.add((row.get("name_ru") or row.get("name") or "").strip())
         missing.discard("")
         if missing:
             uz_map = translate_product_names(sorted(missing), "ru", "uz")
+            receipt_items = {}
             for receipt in receipts:
                 changed = False
                 for item in receipt.get("items", []):
@@ -4336,23 +4931,60 @@ def _translate_user_content(user_id: int, src_lang: str, dst_lang: str) -> bool:
                             item.setdefault("name_ru", base)
                             changed = True
                 if changed:
-                    db.update_receipt_items(receipt["id"], receipt.get("items", []))
+                    receipt_items[receipt["id"]] = receipt.get("items", [])
+            purchase_names = {}
             for row in purchases:
                 if not (row.get("name_uz") or "").strip():
                     base = (row.get("name_ru") or row.get("name") or "").strip()
                     if base and uz_map.get(base):
-                        db.update_purchase_item_names(row["id"], name_ru=base, name_uz=uz_map[base])
+                        purchase_names[row["id"]] = (base, uz_map[base])
+            with db.connection():
+                db.update_receipts_items(receipt_items)
+                db.update_purchase_item_names(purchase_names)
     return True
 
 
 def save_receipt(user_id: int, receipt: Dict[str, Any]) -> int:
-    """Persist the processed receipt; returns the stored receipt id."""
-    return db.save_receipt(user_id, receipt)
-
-
-def save_purchase_history(user_id: int, receipt_id: int, receipt: Dict[str, Any]) -> int:
-    """Append all receipt items to the user's purchase history."""
-    return db.add_purchase_history_items(user_id, receipt_id, receipt)
+    """Persist the processed receipt together with its per-item purchase
+    history in one transaction; returns the stored receipt id."""
+    _receipt_category_sums.discard(user_id)
+    receipt_id, _ = db.save_receipt_with_history(user_id, receipt)
+    return receipt_id
+
+
+# user_id -> ((receipt count, total, newest receipt id), {raw category: summed
+# price}). The per-item category sums are the only part of analytics that needs
+# every receipt's items; they are reused while the SQL fingerprint is unchanged,
+# so receipts added or replaced by other instances still invalidate the entry.
+# Capped and TTL-bounded, since every user who opens analytics gets an entry.
+_RECEIPT_SUMS_CACHE_SIZE = 4096
+_RECEIPT_SUMS_TTL = 3600
+_receipt_category_sums = BoundedCache(_RECEIPT_SUMS_CACHE_SIZE, ttl=_RECEIPT_SUMS_TTL)
+
+
+def _receipt_fingerprint(totals: Dict[str, Any]) -> Tuple[int, float, Any]:
+    # Cents, so float summation order in the two queries cannot force a miss.
+    return totals["count"], round(totals["total"], 2), totals.get("last_id")
+
+
+def _receipt_totals_and_category_sums(user_id: int) -> Tuple[Dict[str, Any], Dict[Any, float]]:
+    """Receipt totals and {raw category: summed price}. One aggregate query
+    while the cached sums are current; otherwise one query for totals and items."""
+    cached = _receipt_category_sums.get(user_id)
+    if cached is not None:
+        totals = db.get_receipt_totals(user_id)
+        if _receipt_fingerprint(totals) == cached[0]:
+            return totals, cached[1]
+    totals, receipts_items = db.get_receipt_totals_and_items(user_id)
+    # One pass sums prices per raw category; localizing and rounding then run
+    # once per distinct category instead of once per item.
+    raw_by_category: Dict[Any, float] = {}
+    for items in receipts_items:
+        for item in items:
+            raw_cat = item.get("category")
+            raw_by_category[raw_cat] = raw_by_category.get(raw_cat, 0) + (item.get("price") or 0)
+    _receipt_category_sums.set(user_id, (_receipt_fingerprint(totals), raw_by_category))
+    return totals, raw_by_category
 
 
 def update_analytics(user_id: int, lang: str = "ru") -> Dict[str, Any]:
@@ -4362,16 +4994,16 @@ def update_analytics(user_id: int, lang: str = "ru") -> Dict[str, Any]:
     most expensive first and percentage distribution) and recent purchases.
     Category and product names are localized into `lang`.
     """
-    receipts = db.get_user_receipts(user_id)
-    total_spent = round(sum(r.get("total") or 0 for r in receipts), 2)
-    receipt_count = len(receipts)
+    totals, raw_category_sums = _receipt_totals_and_category_sums(user_id)
+    total_spent = round(totals["total"], 2)
+    receipt_count = totals["count"]
     average_receipt = round(total_spent / receipt_count, 2) if receipt_count else 0
 
     by_category: Dict[str, float] = {}
-    for receipt in receipts:
-        for item in receipt.get("items", []):
-            cat = localize_receipt_category(item.get("category"), lang)
-            by_category[cat] = round(by_category.get(cat, 0) + (item.get("price") or 0), 2)
+    for raw_cat, amount in raw_category_sums.items():
+        cat = localize_receipt_category(raw_cat, lang)
+        by_category[cat] = by_category.get(cat, 0) + amount
+    by_category = {cat: round(amount, 2) for cat, amount in by_category.items()}
 
     top_categories = [
         {"category": cat, "amount": amount,
@@ -4379,7 +5011,7 @@ def update_analytics(user_id: int, lang: str = "ru") -> Dict[str, Any]:
         for cat, amount in sorted(by_category.items(), key=lambda kv: kv[1], reverse=True)
     ]
 
-    currency = localize_currency(receipts[0].get("currency") if receipts else "", lang)
+    currency = localize_currency(totals["currency"], lang)
     recent_purchases = [localize_receipt_item(p, lang)
                         for p in db.get_purchase_history(user_id, limit=10)]
 
@@ -4406,8 +5038,8 @@ async def scan_receipt(
     the purchase history, and fresh analytics are returned for the UI.
     """
     try:
-        logger.info(f"Receipt scan: user={user_id}, lang={language}")
-        lang = language if language in ("ru", "uz") else "ru"
+        logger.info("Receipt scan: user=%s, lang=%s", user_id, language)
+        lang = language if language in SUPPORTED_LANGUAGES else "ru"
 
         if not _is_openai_available():
             msg = ("Сервис AI временно недоступен: не настроен OPENAI_API_KEY."
@@ -4435,7 +5067,7 @@ async def scan_receipt(
         try:
             raw_receipt = await asyncio.to_thread(analyze_receipt_image, content, mime)
         except Exception as e:
-            logger.error(f"Receipt vision error: {e}", exc_info=True)
+            logger.error("Receipt vision error: %s", e, exc_info=True)
             raw_receipt = None
 
         if not raw_receipt:
@@ -4448,12 +5080,12 @@ async def scan_receipt(
             return JSONResponse(status_code=400,
                                 content={"success": False, "error": RECEIPT_ERROR_MESSAGES[lang]})
 
-        receipt_id = save_receipt(user_id, receipt)
-        save_purchase_history(user_id, receipt_id, receipt)
-        analytics = update_analytics(user_id, lang)
+        # Blocking DB writes/reads (with retry backoff) stay off the event loop.
+        receipt_id = await asyncio.to_thread(save_receipt, user_id, receipt)
+        analytics = await asyncio.to_thread(update_analytics, user_id, lang)
 
-        logger.info(f"Receipt saved: id={receipt_id}, store={receipt['store']}, "
-                    f"items={len(receipt['items'])}, total={receipt['total']}")
+        logger.info("Receipt saved: id=%s, store=%s, items=%s, total=%s",
+                    receipt_id, receipt['store'], len(receipt['items']), receipt['total'])
 
         return JSONResponse(content={
             "success": True,
@@ -4461,7 +5093,7 @@ async def scan_receipt(
             "analytics": analytics,
         })
     except Exception as e:
-        logger.error(f"Receipt scan error: {e}", exc_info=True)
+        logger.error("Receipt scan error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4470,15 +5102,20 @@ async def get_receipts(user_id: int, lang: str = Query("")):
     """Receipt analytics + saved receipts for the Analytics/History pages,
     localized into the requested (or the user's stored) language."""
     try:
-        language = lang if lang in ("ru", "uz") else db.get_user_language(user_id)
-        receipts = [localize_receipt(r, language) for r in db.get_user_receipts(user_id)]
+        language = lang if lang in SUPPORTED_LANGUAGES else db.get_user_language(user_id)
+        # The receipt list and the analytics queries are independent: run them
+        # in worker threads at once so their round trips overlap.
+        stored_receipts, analytics = await asyncio.gather(
+            asyncio.to_thread(db.get_user_receipts, user_id),
+            asyncio.to_thread(update_analytics, user_id, language),
+        )
         return JSONResponse(content={
             "success": True,
-            "analytics": update_analytics(user_id, language),
-            "receipts": receipts,
+            "analytics": analytics,
+            "receipts": [localize_receipt(r, language) for r in stored_receipts],
         })
     except Exception as e:
-        logger.error(f"Get receipts error: {e}", exc_info=True)
+        logger.error("Get receipts error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4486,14 +5123,14 @@ async def get_receipts(user_id: int, lang: str = Query("")):
 async def get_purchases(user_id: int, limit: int = Query(200, ge=1, le=1000), lang: str = Query("")):
     """Per-item purchase history (foundation for repeat purchases / AI recommendations)."""
     try:
-        language = lang if lang in ("ru", "uz") else db.get_user_language(user_id)
+        language = lang if lang in SUPPORTED_LANGUAGES else db.get_user_language(user_id)
         return JSONResponse(content={
             "success": True,
             "purchases": [localize_receipt_item(p, language)
                           for p in db.get_purchase_history(user_id, limit=limit)],
         })
     except Exception as e:
-        logger.error(f"Get purchases error: {e}", exc_info=True)
+        logger.error("Get purchases error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4545,7 +5182,7 @@ async def reuse_receipt(user_id: int, receipt_id: int):
         db.save_active_list(user_id, list_json)
         return JSONResponse(content={"success": True, "data": list_json})
     except Exception as e:
-        logger.error(f"Reuse receipt error: {e}", exc_info=True)
+        logger.error("Reuse receipt error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4566,7 +5203,7 @@ async def toggle_purchase(user_id: int, request: TogglePurchaseRequest = Body(..
 
         return JSONResponse(content=response_data)
     except Exception as e:
-        logger.error(f"Toggle error: {e}")
+        logger.error("Toggle error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4587,7 +5224,7 @@ async def toggle_category_purchase(user_id: int, request: ToggleCategoryRequest
 
         return JSONResponse(content=response_data)
     except Exception as e:
-        logger.error(f"Toggle category error: {e}")
+        logger.error("Toggle category error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4609,7 +5246,7 @@ async def edit_item(user_id: int, request: ItemEditRequest):
 
         return JSONResponse(content={"success": True, "data": list_data, "message": "Item updated"})
     except Exception as e:
-        logger.error(f"Edit item error: {e}")
+        logger.error("Edit item error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4634,7 +5271,7 @@ async def edit_shopping_list(user_id: int, edit_request: EditRequest):
 
         return JSONResponse(content={"success": True, "changes": changes, "data": list_data, "message": "List updated"})
     except Exception as e:
-        logger.error(f"Edit list error: {e}")
+        logger.error("Edit list error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4650,13 +5287,14 @@ async def confirm_purchase_completion(user_id: int, confirm_request: ExpenseConf
 
         if confirmed:
             if save_to_history and list_data and list_data.get("total_items", 0) > 0:
-                db.add_history_entry(user_id, list_data)
+                # History insert + trim-to-50 is blocking DB work; keep it off the event loop.
+                await asyncio.to_thread(db.add_history_entry, user_id, list_data)
             db.delete_active_list(user_id)
             return JSONResponse(content={"success": True, "message": "List completed", "completed": True})
         else:
             return JSONResponse(content={"success": True, "message": "Continue shopping", "completed": False})
     except Exception as e:
-        logger.error(f"Confirm error: {e}")
+        logger.error("Confirm error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4672,7 +5310,7 @@ async def bazaar_start(user_id: int):
         db.save_active_list(user_id, list_data)
         return JSONResponse(content={"success": True, "data": list_data, "summary": bazaar_summary(list_data)})
     except Exception as e:
-        logger.error(f"Bazaar start error: {e}", exc_info=True)
+        logger.error("Bazaar start error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4687,7 +5325,7 @@ async def bazaar_stop(user_id: int):
         db.save_active_list(user_id, list_data)
         return JSONResponse(content={"success": True, "data": list_data, "summary": bazaar_summary(list_data)})
     except Exception as e:
-        logger.error(f"Bazaar stop error: {e}", exc_info=True)
+        logger.error("Bazaar stop error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4701,7 +5339,7 @@ async def bazaar_say(user_id: int, request: BazaarSayRequest):
         status, payload = await process_bazaar_text(user_id, text, request.language)
         return JSONResponse(status_code=status, content=payload)
     except Exception as e:
-        logger.error(f"Bazaar say error: {e}", exc_info=True)
+        logger.error("Bazaar say error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4713,8 +5351,8 @@ async def bazaar_voice(
 ):
     """Dictated bazaar phrase: transcribe, then process like /say."""
     try:
-        logger.info(f"Bazaar voice: user={user_id}, lang={language}")
-        if language not in ["ru", "uz"]:
+        logger.info("Bazaar voice: user=%s, lang=%s", user_id, language)
+        if language not in SUPPORTED_LANGUAGES:
             return JSONResponse(status_code=400, content={"success": False, "error": "Unsupported language"})
         if language == "uz":
             return JSONResponse(content={
@@ -4730,7 +5368,7 @@ async def bazaar_voice(
         payload["transcribed_text"] = text
         return JSONResponse(status_code=status, content=payload)
     except Exception as e:
-        logger.error(f"Bazaar voice error: {e}", exc_info=True)
+        logger.error("Bazaar voice error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4751,11 +5389,11 @@ async def bazaar_finish(user_id: int):
         if summary["actual_total"]:
             list_data["total_estimated_price"] = summary["actual_total"]
         if list_data.get("total_items", 0) > 0:
-            db.add_history_entry(user_id, list_data)
+            await asyncio.to_thread(db.add_history_entry, user_id, list_data)
         db.delete_active_list(user_id)
         return JSONResponse(content={"success": True, "completed": True, "report": summary})
     except Exception as e:
-        logger.error(f"Bazaar finish error: {e}", exc_info=True)
+        logger.error("Bazaar finish error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4765,7 +5403,7 @@ async def clear_shopping_list(user_id: int):
         db.delete_active_list(user_id)
         return JSONResponse(content={"success": True, "message": "List cleared"})
     except Exception as e:
-        logger.error(f"Clear list error: {e}")
+        logger.error("Clear list error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4775,7 +5413,7 @@ async def get_history(user_id: int):
         history = db.get_user_history(user_id)
         return JSONResponse(content={"success": True, "data": history})
     except Exception as e:
-        logger.error(f"Get history error: {e}")
+        logger.error("Get history error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4807,7 +5445,7 @@ async def reuse_history_list(user_id: int, list_id: str):
 
         return JSONResponse(content={"success": True, "data": list_json})
     except Exception as e:
-        logger.error(f"Reuse history error: {e}")
+        logger.error("Reuse history error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4819,7 +5457,7 @@ async def clear_history(user_id: int):
             return JSONResponse(content={"success": True, "message": "History cleared"})
         return JSONResponse(status_code=404, content={"success": False, "error": "History not found"})
     except Exception as e:
-        logger.error(f"Clear history error: {e}")
+        logger.error("Clear history error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4846,7 +5484,7 @@ async def get_budget(user_id: int):
     try:
         return JSONResponse(content={"success": True, "budget": db.get_user_budget(user_id)})
     except Exception as e:
-        logger.error(f"Get budget error: {e}")
+        logger.error("Get budget error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4859,7 +5497,7 @@ async def set_budget(user_id: int, request: BudgetRequest):
         db.set_user_budget(user_id, amount)
         return JSONResponse(content={"success": True, "budget": amount})
     except Exception as e:
-        logger.error(f"Set budget error: {e}")
+        logger.error("Set budget error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -4906,7 +5544,7 @@ PAY_FLOW = os.getenv("PAY_FLOW", "telegram").strip().lower()
 
 
 def _payme_now_ms() -> int:
-    return int(datetime.now().timestamp() * 1000)
+    return time.time_ns() // 1_000_000
 
 
 def build_payme_checkout_url(merchant_id: str, order_id: int, amount_sum: int,
@@ -4931,7 +5569,6 @@ def build_click_checkout_url(service_id: str, merchant_id: str, amount_sum: int,
 def click_signature(params: Dict[str, Any], secret_key: str) -> str:
     """Подпись запроса Click SHOP API. Для action=1 (complete) в строку входит
     merchant_prepare_id; суммы и id участвуют строками как пришли в запросе."""
-    import hashlib
     parts = [str(params.get("click_trans_id", "")), str(params.get("service_id", "")), secret_key,
              str(params.get("merchant_trans_id", ""))]
     if str(params.get("action", "")) == "1":
@@ -5033,7 +5670,7 @@ async def get_pro_status(user_id: int):
     try:
         return JSONResponse(content={"success": True, **pro_status_response(user_id, start_trial_if_new=True)})
     except Exception as e:
-        logger.error(f"Get pro status error: {e}")
+        logger.error("Get pro status error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -5070,21 +5707,21 @@ async def create_pro_invoice(user_id: int, request: ProInvoiceRequest = Body(...
             # Telegram принимает суммы в минимальных единицах валюты (тийины)
             "prices": [{"label": title, "amount": PRO_PRICE_MONTHLY * 100}],
         }
-        timeout = aiohttp.ClientTimeout(total=15)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.post(
-                f"https://api.telegram.org/bot{Config.TELEGRAM_BOT_TOKEN}/createInvoiceLink",
-                json=invoice,
-            ) as resp:
-                data = await resp.json()
+        session = await get_http_session()
+        async with session.post(
+            f"https://api.telegram.org/bot{Config.TELEGRAM_BOT_TOKEN}/createInvoiceLink",
+            json=invoice,
+            timeout=aiohttp.ClientTimeout(total=15),
+        ) as resp:
+            data = await resp.json(loads=json_codec.loads)
 
         if not data.get("ok"):
-            logger.error(f"createInvoiceLink failed for user={user_id}, provider={provider}: {data}")
+            logger.error("createInvoiceLink failed for user=%s, provider=%s: %s", user_id, provider, data)
             return JSONResponse(status_code=502,
                                 content={"success": False,
                                          "error": data.get("description") or "Telegram invoice error"})
 
-        logger.info(f"Invoice created: user={user_id}, provider={provider}, test={':TEST:' in token}")
+        logger.info("Invoice created: user=%s, provider=%s, test=%s", user_id, provider, ':TEST:' in token)
         return JSONResponse(content={
             "success": True,
             "invoice_url": data["result"],
@@ -5092,7 +5729,7 @@ async def create_pro_invoice(user_id: int, request: ProInvoiceRequest = Body(...
             "test_mode": ":TEST:" in token,
         })
     except Exception as e:
-        logger.error(f"Create invoice error: {e}", exc_info=True)
+        logger.error("Create invoice error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -5122,12 +5759,12 @@ async def create_pro_checkout(user_id: int, request: ProInvoiceRequest = Body(..
         else:
             return JSONResponse(status_code=400, content={"success": False, "error": f"Unknown provider: {provider}"})
 
-        logger.info(f"Checkout created: order={order['id']}, user={user_id}, provider={provider}, "
-                    f"amount={PRO_PRICE_MONTHLY}")
+        logger.info("Checkout created: order=%s, user=%s, provider=%s, amount=%s",
+                    order['id'], user_id, provider, PRO_PRICE_MONTHLY)
         return JSONResponse(content={"success": True, "checkout_url": url, "order_id": order["id"],
                                      "amount": PRO_PRICE_MONTHLY, "provider": provider, "test_mode": test_mode})
     except Exception as e:
-        logger.error(f"Create checkout error: {e}", exc_info=True)
+        logger.error("Create checkout error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -5205,8 +5842,8 @@ def _payme_perform_transaction(request_id, params):
     perform_time = _payme_now_ms()
     db.update_payment_order(order["id"], payme_state=2, payme_perform_time=perform_time, state="paid")
     db.start_paid_subscription(order["user_id"], PRO_PAID_PERIOD_DAYS)
-    logger.info(f"Payme payment performed: order={order['id']}, user={order['user_id']}, "
-                f"amount={order['amount']} — Pro activated")
+    logger.info("Payme payment performed: order=%s, user=%s, amount=%s — Pro activated",
+                order['id'], order['user_id'], order['amount'])
     return _payme_result(request_id, {"transaction": str(order["id"]),
                                       "perform_time": perform_time, "state": 2})
 
@@ -5226,8 +5863,8 @@ def _payme_cancel_transaction(request_id, params):
     if new_state == -2:
         # возврат после проведения: подписку не откатываем автоматически —
         # решение о даунгрейде принимается вручную (см. логи)
-        logger.warning(f"Payme REFUND: order={order['id']}, user={order['user_id']} — "
-                       f"subscription left active, handle manually")
+        logger.warning("Payme REFUND: order=%s, user=%s — subscription left active, handle manually",
+                       order['id'], order['user_id'])
     return _payme_result(request_id, {"transaction": str(order["id"]),
                                       "cancel_time": cancel_time, "state": new_state})
 
@@ -5289,7 +5926,7 @@ async def payme_merchant_api(request: Request):
             return _payme_error(request_id, -32601, f"Метод не найден: {method}")
         return handler(request_id, body.get("params") or {})
     except Exception as e:
-        logger.error(f"Payme API error: {e}", exc_info=True)
+        logger.error("Payme API error: %s", e, exc_info=True)
         return _payme_error(request_id, -32400, "Внутренняя ошибка сервера")
 
 
@@ -5333,7 +5970,7 @@ async def click_prepare(request: Request):
                                 click_trans_id=str(params.get("click_trans_id", "")))
         return _click_response(params, 0, "Success", merchant_prepare_id=order["id"])
     except Exception as e:
-        logger.error(f"Click prepare error: {e}", exc_info=True)
+        logger.error("Click prepare error: %s", e, exc_info=True)
         return JSONResponse(content={"error": -8, "error_note": "Internal error"})
 
 
@@ -5368,11 +6005,11 @@ async def click_complete(request: Request):
 
         db.update_payment_order(order["id"], state="paid")
         db.start_paid_subscription(order["user_id"], PRO_PAID_PERIOD_DAYS)
-        logger.info(f"Click payment completed: order={order['id']}, user={order['user_id']}, "
-                    f"amount={order['amount']} — Pro activated")
+        logger.info("Click payment completed: order=%s, user=%s, amount=%s — Pro activated",
+                    order['id'], order['user_id'], order['amount'])
         return _click_response(params, 0, "Success", merchant_confirm_id=order["id"])
     except Exception as e:
-        logger.error(f"Click complete error: {e}", exc_info=True)
+        logger.error("Click complete error: %s", e, exc_info=True)
         return JSONResponse(content={"error": -8, "error_note": "Internal error"})
 
 
@@ -5384,10 +6021,10 @@ async def subscribe_pro(user_id: int, request: Request):
         if PRO_INTERNAL_KEY and request.headers.get("X-Internal-Key") != PRO_INTERNAL_KEY:
             return JSONResponse(status_code=403, content={"success": False, "error": "Forbidden"})
         db.start_paid_subscription(user_id, PRO_PAID_PERIOD_DAYS)
-        logger.info(f"Pro subscription activated: user={user_id}, days={PRO_PAID_PERIOD_DAYS}")
+        logger.info("Pro subscription activated: user=%s, days=%s", user_id, PRO_PAID_PERIOD_DAYS)
         return JSONResponse(content={"success": True, **pro_status_response(user_id)})
     except Exception as e:
-        logger.error(f"Subscribe error: {e}")
+        logger.error("Subscribe error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -5398,7 +6035,7 @@ async def set_pro_status(user_id: int, request: ProStatusRequest = Body(...)):
         db.set_user_pro(user_id, request.is_pro)
         return JSONResponse(content={"success": True, **pro_status_response(user_id)})
     except Exception as e:
-        logger.error(f"Set pro status error: {e}")
+        logger.error("Set pro status error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -5408,7 +6045,7 @@ async def share_list(share_request: ShareRequest, request: Request):
         user_id = share_request.user_id
         list_id = share_request.list_id
 
-        logger.info(f"Share request: user={user_id}, list_id={list_id}")
+        logger.info("Share request: user=%s, list_id=%s", user_id, list_id)
 
         list_data = db.get_active_list(user_id)
         if not list_data or list_data.get("total_items", 0) == 0:
@@ -5436,9 +6073,9 @@ async def share_list(share_request: ShareRequest, request: Request):
 
         share_text = share_text_ru if lang == "ru" else share_text_uz
 
-        logger.info(f"Created shared list: token={share_token}, owner={user_id}")
+        logger.info("Created shared list: token=%s, owner=%s", share_token, user_id)
 
-        logger.info(f"Created shared list: token={share_token}, owner={user_id}")
+        logger.info("Created shared list: token=%s, owner=%s", share_token, user_id)
 
         return JSONResponse(content={
             "success": True,
@@ -5452,7 +6089,7 @@ async def share_list(share_request: ShareRequest, request: Request):
             "message": "List shared successfully"
         })
     except Exception as e:
-        logger.error(f"Share error: {e}", exc_info=True)
+        logger.error("Share error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -5477,7 +6114,7 @@ async def shared_page(token: str, request: Request):
 @app.get("/api/shared/{token}")
 async def get_shared_list(token: str, user_id: Optional[int] = Query(None)):
     try:
-        logger.info(f"Get shared list: token={token}, user_id={user_id}")
+        logger.info("Get shared list: token=%s, user_id=%s", token, user_id)
 
         shared = shared_list_service.get_shared_snapshot(token)
 
@@ -5501,7 +6138,8 @@ async def get_shared_list(token: str, user_id: Optional[int] = Query(None)):
                 payload = owner_list
                 live = True
 
-        response_data = copy.deepcopy(payload)
+        # Only top-level keys are added, so a shallow copy keeps the source intact.
+        response_data = dict(payload)
         response_data["localization"] = LOCALIZATION[lang]
         response_data["is_shared"] = True
         response_data["shared_list_id"] = token
@@ -5514,7 +6152,7 @@ async def get_shared_list(token: str, user_id: Optional[int] = Query(None)):
             "live": live
         })
     except Exception as e:
-        logger.error(f"Get shared list error: {e}", exc_info=True)
+        logger.error("Get shared list error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -5545,14 +6183,14 @@ async def toggle_shared_purchase(token: str, request: SharedToggleRequest = Body
             owner_list = toggle_category_purchased_in_list(owner_list, request.category)
         db.save_active_list(owner_id, owner_list)
 
-        response_data = copy.deepcopy(owner_list)
+        response_data = dict(owner_list)
         response_data["is_shared"] = True
         response_data["shared_list_id"] = token
         response_data["owner_id"] = owner_id
 
         return JSONResponse(content={"success": True, "data": response_data, "live": True})
     except Exception as e:
-        logger.error(f"Shared toggle error: {e}", exc_info=True)
+        logger.error("Shared toggle error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -5563,7 +6201,7 @@ async def add_shared_list_to_my_list(request: AddSharedListRequest):
         shared_list_id = request.shared_list_id
         lang = request.language
 
-        logger.info(f"Add shared list to my list: user={user_id}, shared_id={shared_list_id}")
+        logger.info("Add shared list to my list: user=%s, shared_id=%s", user_id, shared_list_id)
 
         shared = shared_list_service.get_shared_snapshot(shared_list_id)
         if not shared:
@@ -5598,7 +6236,7 @@ async def add_shared_list_to_my_list(request: AddSharedListRequest):
 
         db.save_active_list(user_id, list_data)
 
-        logger.info(f"Successfully added shared list {shared_list_id} to user {user_id}")
+        logger.info("Successfully added shared list %s to user %s", shared_list_id, user_id)
 
         return JSONResponse(content={
             "success": True,
@@ -5606,7 +6244,7 @@ async def add_shared_list_to_my_list(request: AddSharedListRequest):
             "message": "List added successfully"
         })
     except Exception as e:
-        logger.error(f"Add shared list error: {e}", exc_info=True)
+        logger.error("Add shared list error: %s", e, exc_info=True)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -5630,18 +6268,17 @@ async def search_prices(query: str = Query(...), lang: str = Query("ru")):
 
         return JSONResponse(content={"success": True, "results": results})
     except Exception as e:
-        logger.error(f"Search prices error: {e}")
+        logger.error("Search prices error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
 @app.post("/api/set-language")
 async def set_language(request: SetLanguageRequest):
     try:
-        if request.language not in ["ru", "uz"]:
+        if request.language not in SUPPORTED_LANGUAGES:
             return JSONResponse(status_code=400, content={"success": False, "error": "Unsupported language"})
 
-        old_language = db.get_user_language(request.user_id)
-        db.set_user_language(request.user_id, request.language)
+        old_language = db.switch_user_language(request.user_id, request.language)
 
         # Switching the interface language must also switch stored content:
         # the active bazaar list, saved history lists and scanned receipt
@@ -5652,12 +6289,12 @@ async def set_language(request: SetLanguageRequest):
                 translated = await asyncio.to_thread(
                     _translate_user_content, request.user_id, old_language, request.language)
             except Exception as e:
-                logger.error(f"Language content translation error: {e}", exc_info=True)
+                logger.error("Language content translation error: %s", e, exc_info=True)
 
         return JSONResponse(content={"success": True, "translated": translated,
                                      "message": f"Language set to {request.language}"})
     except Exception as e:
-        logger.error(f"Set language error: {e}")
+        logger.error("Set language error: %s", e)
         return JSONResponse(status_code=500, content={"success": False, "error": "Internal server error"})
 
 
@@ -5668,12 +6305,13 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
         while True:
             data = await websocket.receive_text()
             if data == "ping":
-                await ws_manager.send_personal_message(user_id, {"type": "pong"})
+                await ws_manager.send_personal_text(user_id, WS_PONG_FRAME)
     except WebSocketDisconnect:
-        ws_manager.disconnect(user_id)
+        pass
     except Exception as e:
-        logger.error(f"WebSocket error: {e}")
-        ws_manager.disconnect(user_id)
+        logger.error("WebSocket error: %s", e)
+    finally:
+        ws_manager.disconnect(user_id, websocket)
 
 
 # ===== RUN =====
@@ -33,6 +33,13 @@ from aiogram.filters import Command, CommandStart
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message, PreCheckoutQuery
 from dotenv import load_dotenv
 
+import json_codec
+
+try:
+    import uvloop  # libuv event loop; ships with uvicorn[standard] (not on Windows)
+except ImportError:  # pragma: no cover - depends on the environment
+    uvloop = None
+
 load_dotenv()
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
@@ -148,15 +155,36 @@ def build_saved_list_text(list_data: Dict[str, Any], lang: str, preview_limit: i
 
 # ── вызовы бэкенда ────────────────────────────────────────────────────────────
 
+# Одна сессия на весь процесс: запросы к бэкенду идут по keep-alive соединениям
+# из пула, а не открывают новое TCP-соединение на каждое сообщение.
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            timeout=HTTP_TIMEOUT,
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=60),
+        )
+    return _session
+
+
+async def close_session() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
 async def api_chat(user_id: int, text: str, lang: str) -> Optional[Dict[str, Any]]:
     try:
-        async with aiohttp.ClientSession(timeout=HTTP_TIMEOUT) as session:
-            async with session.post(f"{BACKEND_URL}/api/chat", json={
-                "user_id": user_id, "text": text, "language": lang, "is_voice": False,
-            }) as resp:
-                return await resp.json()
+        async with get_session().post(f"{BACKEND_URL}/api/chat", json={
+            "user_id": user_id, "text": text, "language": lang, "is_voice": False,
+        }) as resp:
+            return await resp.json(loads=json_codec.loads)
     except Exception as e:
-        logger.error(f"/api/chat failed: {e}")
+        logger.error("/api/chat failed: %s", e)
         return None
 
 
@@ -165,11 +193,10 @@ async def api_activate_pro(user_id: int) -> Optional[Dict[str, Any]]:
     Бот — единственный доверенный источник факта оплаты."""
     headers = {"X-Internal-Key": BOZORLIK_INTERNAL_KEY} if BOZORLIK_INTERNAL_KEY else {}
     try:
-        async with aiohttp.ClientSession(timeout=HTTP_TIMEOUT) as session:
-            async with session.post(f"{BACKEND_URL}/api/pro/{user_id}/subscribe", headers=headers) as resp:
-                return await resp.json()
+        async with get_session().post(f"{BACKEND_URL}/api/pro/{user_id}/subscribe", headers=headers) as resp:
+            return await resp.json(loads=json_codec.loads)
     except Exception as e:
-        logger.error(f"/api/pro/subscribe failed: {e}")
+        logger.error("/api/pro/subscribe failed: %s", e)
         return None
 
 
@@ -180,11 +207,10 @@ async def api_voice(user_id: int, audio: bytes, filename: str = "voice.ogg") ->
     form.add_field("language", "ru")
     form.add_field("voice_file", audio, filename=filename, content_type="audio/ogg")
     try:
-        async with aiohttp.ClientSession(timeout=HTTP_TIMEOUT) as session:
-            async with session.post(f"{BACKEND_URL}/api/voice", data=form) as resp:
-                return await resp.json()
+        async with get_session().post(f"{BACKEND_URL}/api/voice", data=form) as resp:
+            return await resp.json(loads=json_codec.loads)
     except Exception as e:
-        logger.error(f"/api/voice failed: {e}")
+        logger.error("/api/voice failed: %s", e)
         return None
 
 
@@ -224,7 +250,7 @@ async def on_voice(message: Message) -> None:
     try:
         await message.bot.download(voice, destination=buffer)
     except Exception as e:
-        logger.error(f"Voice download failed: {e}")
+        logger.error("Voice download failed: %s", e)
         await message.answer(MESSAGES[lang]["voice_failed"])
         return
     data = await api_voice(message.from_user.id, buffer.getvalue())
@@ -259,7 +285,7 @@ async def on_pre_checkout(query: PreCheckoutQuery) -> None:
     ok = payload.startswith(PRO_PAYLOAD_PREFIX) and query.currency == "UZS"
     await query.answer(ok=ok, error_message=None if ok else MESSAGES[lang]["pro_bad_invoice"])
     if not ok:
-        logger.warning(f"Rejected pre_checkout: payload={payload!r}, currency={query.currency}")
+        logger.warning("Rejected pre_checkout: payload=%r, currency=%s", payload, query.currency)
 
 
 @router.message(F.successful_payment)
@@ -271,8 +297,8 @@ async def on_successful_payment(message: Message) -> None:
         user_id = int(payload.split(":")[1])
     except (IndexError, ValueError):
         user_id = message.from_user.id  # payload повреждён — активируем плательщику
-    logger.info(f"Payment received: user={user_id}, amount={sp.total_amount} {sp.currency}, "
-                f"provider_charge_id={sp.provider_payment_charge_id}")
+    logger.info("Payment received: user=%s, amount=%s %s, provider_charge_id=%s",
+                user_id, sp.total_amount, sp.currency, sp.provider_payment_charge_id)
 
     data = await api_activate_pro(user_id)
     if data and data.get("success") and data.get("plan") == "paid":
@@ -306,9 +332,15 @@ async def main() -> None:
     dp.include_router(router)
     # long polling: снимаем webhook, если был настроен раньше
     await bot.delete_webhook(drop_pending_updates=False)
-    logger.info(f"Bozorlik bot started (backend: {BACKEND_URL})")
-    await dp.start_polling(bot)
+    logger.info("Bozorlik bot started (backend: %s)", BACKEND_URL)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await close_session()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
@@ -0,0 +1,54 @@
+"""Small in-process cache shared by the API and the database layer.
+
+Request handlers run catalog pricing and DB helpers in worker threads
+(asyncio.to_thread), so the memo dicts they fill are shared across threads.
+BoundedCache keeps every read, insert and eviction under one lock.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class BoundedCache:
+    """Thread-safe cache holding at most max_entries items, evicting the
+    oldest insert first. With ttl (seconds) entries also expire; ttl <= 0
+    disables caching entirely."""
+
+    def __init__(self, max_entries: int, ttl: Optional[float] = None):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries: Dict[Hashable, Tuple[Any, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self._ttl is not None and self._ttl <= 0:
+            return
+        expires_at = time.monotonic() + self._ttl if self._ttl is not None else None
+        with self._lock:
+            self._entries.pop(key, None)
+            while self._entries and len(self._entries) >= self._max_entries:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (value, expires_at)
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
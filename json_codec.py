@@ -0,0 +1,58 @@
+"""JSON encoding helpers backed by orjson, with a stdlib fallback.
+
+orjson parses ~2x and serializes 2-6x faster than the json module and emits
+UTF-8 directly (same output as json with ensure_ascii=False). If orjson is not
+installed the helpers fall back to json, so callers never need to care.
+"""
+
+import json
+import mmap
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """Parse JSON from str or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def load_file(path) -> Any:
+    """Parse a JSON file. With orjson the file is memory-mapped and parsed in
+    place, so no intermediate bytes copy of the whole file is made."""
+    with open(path, "rb") as f:
+        if orjson is None:
+            return json.loads(f.read())
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file cannot be mapped
+            return orjson.loads(f.read())
+        with mapped:
+            view = memoryview(mapped)
+            try:
+                return orjson.loads(view)
+            finally:
+                view.release()
+
+
+def dumps_bytes(obj: Any, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes (non-str dict keys are stringified)."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None,
+                      separators=None if indent else (",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """Serialize to a JSON string."""
+    return dumps_bytes(obj, indent=indent).decode("utf-8")
@@ -1,49 +1,154 @@
-from sqlalchemy import create_engine, inspect, text
-from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import create_engine, event, func, insert, inspect, select, text, update
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
 from sqlalchemy.engine.url import make_url
 from sqlalchemy.pool import QueuePool
-from typing import Optional, Dict, Any
-import json
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import Optional, Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 import logging
+import os
+import threading
+import time
 from datetime import datetime, timedelta
 
-from postgres_models import Base, ActiveList, SharedList, UserHistory, UserLanguage, Receipt, PurchaseHistoryItem, UserBudget, UserPro, PaymentOrder
+import json_codec
+from bounded_cache import BoundedCache
+from postgres_models import Base, ActiveList, SharedList, UserHistory, UserLanguage, Receipt, PurchaseHistoryItem, UserBudget, UserPro, PaymentOrder, SchemaVersion
 
 logger = logging.getLogger(__name__)
 
+# User languages change rarely but are read on almost every request, so they
+# are cached in-process; the TTL bounds staleness across app instances.
+LANGUAGE_CACHE_TTL = 300
+LANGUAGE_CACHE_MAX_ENTRIES = 10000
+
+# Bump whenever the models or the _ensure_* upgrade steps change, so the next
+# start runs them once; RUN_MIGRATIONS=1 forces them regardless.
+SCHEMA_VERSION = 4
+
+# Single-column indexes made redundant by a composite index leading with the
+# same column; dropped on upgrade so writes stop maintaining them.
+SUPERSEDED_INDEXES = ('ix_user_history_user_id', 'ix_receipts_user_id', 'ix_purchase_history_user_id')
+
+# Attempts for whole-transaction writes that are safe to replay after a
+# dropped connection or failover (OperationalError rolls everything back).
+DB_WRITE_ATTEMPTS = 3
+DB_RETRY_BACKOFF = 0.1
+
+# A connection checked out for longer than this is reported as possibly leaked.
+DB_LEAK_SECONDS = int(os.getenv('DB_LEAK_SECONDS', '300'))
+
 class PostgresDatabaseManager:
     def __init__(self, database_url: str, echo: bool = False):
         self.database_url = database_url
         url = make_url(database_url)
-        # Use pool settings suitable for small apps
-        self.engine = create_engine(database_url, poolclass=QueuePool, pool_size=5, max_overflow=10, echo=echo)
+        # Pool sizing: sessions are checked out by request handlers and by
+        # asyncio.to_thread workers at once. Steady size ≈ concurrent requests /
+        # queries per request; overflow absorbs bursts (both overridable via env).
+        # Idle pooled sockets are kept alive with TCP keepalives and recycled
+        # before typical server/proxy idle cutoffs, instead of pinging on checkout.
+        # JSON/JSONB columns are (de)serialized with orjson when available
+        self.pool_size = int(os.getenv('DB_POOL_SIZE', '10'))
+        self.max_overflow = int(os.getenv('DB_POOL_MAX_OVERFLOW', '15'))
+        connect_args = {}
+        if url.get_backend_name() == 'postgresql':
+            connect_args = {'keepalives': 1, 'keepalives_idle': 30,
+                            'keepalives_interval': 10, 'keepalives_count': 3}
+        self.engine = create_engine(database_url, poolclass=QueuePool,
+                                    pool_size=self.pool_size,
+                                    max_overflow=self.max_overflow,
+                                    pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+                                    connect_args=connect_args,
+                                    echo=echo,
+                                    json_serializer=json_codec.dumps, json_deserializer=json_codec.loads)
         self.Session = scoped_session(sessionmaker(bind=self.engine))
-        # Ensure tables exist
-        Base.metadata.create_all(self.engine)
-        self._ensure_bilingual_purchase_columns()
-        self._ensure_pro_columns()
+        # Pool bookkeeping for get_pool_stats(): lifetime event counts (a
+        # "connects" count growing faster than recycling explains means
+        # connections are cycled instead of reused) and when each currently
+        # checked-out connection was taken, to spot ones that are never returned.
+        self._pool_counts = {'connects': 0, 'checkouts': 0, 'checkins': 0}
+        self._checked_out_since: Dict[int, float] = {}
+        self._pool_lock = threading.Lock()
+        event.listen(self.engine, 'connect', self._on_pool_connect)
+        event.listen(self.engine, 'checkout', self._on_pool_checkout)
+        event.listen(self.engine, 'checkin', self._on_pool_checkin)
+        event.listen(self.engine, 'close', self._on_pool_checkin)
+        self._language_cache = BoundedCache(LANGUAGE_CACHE_MAX_ENTRIES, ttl=LANGUAGE_CACHE_TTL)
+        self._pinned_connection: ContextVar = ContextVar('pinned_connection', default=None)
+        if os.getenv('RUN_MIGRATIONS') == '1' or not self._schema_is_current():
+            # Ensure tables exist
+            Base.metadata.create_all(self.engine)
+            # Every step runs (and logs its own failure); the version is stamped
+            # only if all succeeded, so a failed step is retried on next start.
+            upgraded = [self._ensure_bilingual_purchase_columns(),
+                        self._ensure_pro_columns(),
+                        self._ensure_indexes()]
+            if all(upgraded):
+                self._stamp_schema_version()
+
+    def _schema_is_current(self) -> bool:
+        """One query instead of per-table/column introspection on every start."""
+        try:
+            with self.engine.connect() as conn:
+                version = conn.execute(select(func.max(SchemaVersion.version))).scalar()
+            return version == SCHEMA_VERSION
+        except SQLAlchemyError:
+            return False  # fresh database: no schema_version table yet
+
+    def _stamp_schema_version(self) -> None:
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(SchemaVersion.__table__.delete())
+                conn.execute(insert(SchemaVersion).values(version=SCHEMA_VERSION))
+        except SQLAlchemyError as e:
+            logger.error("Could not stamp schema version: %s", e)
 
-    def _ensure_bilingual_purchase_columns(self) -> None:
+    def _ensure_bilingual_purchase_columns(self) -> bool:
         """create_all doesn't alter existing tables; add the bilingual name
-        columns to purchase_history when upgrading an older database."""
-        try:
+        columns to purchase_history when upgrading an older database.
+        Returns False if the upgrade failed."""
+        try:
+            if self._is_postgres():
+                # Idempotent DDL, no catalog introspection round trips.
+                with self.engine.begin() as conn:
+                    conn.execute(text('ALTER TABLE purchase_history '
+                                      'ADD COLUMN IF NOT EXISTS name_ru VARCHAR(255), '
+                                      'ADD COLUMN IF NOT EXISTS name_uz VARCHAR(255)'))
+                return True
             columns = {c['name'] for c in inspect(self.engine).get_columns('purchase_history')}
             missing = [c for c in ('name_ru', 'name_uz') if c not in columns]
             if not missing:
-                return
+                return True
             with self.engine.begin() as conn:
                 for column in missing:
                     conn.execute(text(f'ALTER TABLE purchase_history ADD COLUMN {column} VARCHAR(255)'))
-            logger.info(f"Added bilingual columns to purchase_history: {missing}")
+            logger.info("Added bilingual columns to purchase_history: %s", missing)
+            return True
         except Exception as e:
-            logger.error(f"Could not ensure bilingual purchase columns: {e}")
+            logger.error("Could not ensure bilingual purchase columns: %s", e)
+            return False
 
-    def _ensure_pro_columns(self) -> None:
+    def _ensure_pro_columns(self) -> bool:
         """Upgrade the user_pro table created before the trial/subscription
         system: add plan/trial_ends_at/paid_until and convert legacy manual
-        Pro flags into paid-with-no-expiry."""
-        try:
+        Pro flags into paid-with-no-expiry. Returns False if the upgrade failed."""
+        try:
+            if self._is_postgres():
+                # Idempotent DDL, no catalog introspection round trips. The legacy
+                # conversion is safe to repeat: compute_pro_status already treats
+                # is_pro rows with plan 'none' as paid with no expiry.
+                with self.engine.begin() as conn:
+                    conn.execute(text("ALTER TABLE user_pro "
+                                      "ADD COLUMN IF NOT EXISTS plan VARCHAR(16) DEFAULT 'none', "
+                                      "ADD COLUMN IF NOT EXISTS trial_ends_at TIMESTAMP, "
+                                      "ADD COLUMN IF NOT EXISTS paid_until TIMESTAMP"))
+                    conn.execute(text("UPDATE user_pro SET plan='paid' WHERE is_pro AND (plan IS NULL OR plan='none')"))
+                return True
             columns = {c['name'] for c in inspect(self.engine).get_columns('user_pro')}
             statements = []
             if 'plan' not in columns:
@@ -53,49 +158,242 @@ class PostgresDatabaseManager:
             if 'paid_until' not in columns:
                 statements.append('ALTER TABLE user_pro ADD COLUMN paid_until TIMESTAMP')
             if not statements:
-                return
+                return True
             with self.engine.begin() as conn:
                 for statement in statements:
                     conn.execute(text(statement))
                 conn.execute(text("UPDATE user_pro SET plan='paid' WHERE is_pro AND (plan IS NULL OR plan='none')"))
             logger.info("Upgraded user_pro table with subscription columns")
+            return True
         except Exception as e:
-            logger.error(f"Could not ensure user_pro columns: {e}")
+            logger.error("Could not ensure user_pro columns: %s", e)
+            return False
+
+    def _ensure_indexes(self) -> bool:
+        """create_all only builds indexes together with new tables; add indexes
+        declared later on the models to tables that already exist, and drop
+        SUPERSEDED_INDEXES. Returns False if any index could not be changed."""
+        ok = True
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                try:
+                    # IF NOT EXISTS instead of a catalog lookup per index.
+                    with self.engine.begin() as conn:
+                        conn.execute(CreateIndex(index, if_not_exists=True))
+                except Exception as e:
+                    logger.error("Could not ensure index %s: %s", index.name, e)
+                    ok = False
+        for name in SUPERSEDED_INDEXES:
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+            except Exception as e:
+                logger.error("Could not drop index %s: %s", name, e)
+                ok = False
+        return ok
+
+    def warm_pool(self, count: Optional[int] = None) -> int:
+        """Open `count` pooled connections concurrently and return them to the
+        pool, so the first requests skip the TCP/TLS/auth handshake. Defaults
+        to DB_POOL_WARM (4), capped at the pool size. Returns the number opened."""
+        if count is None:
+            count = int(os.getenv('DB_POOL_WARM', '4'))
+        count = min(count, self.pool_size)
+        if count <= 0:
+            return 0
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            conns = list(executor.map(lambda _: self.engine.connect(), range(count)))
+        for conn in conns:
+            conn.close()
+        return len(conns)
+
+    def _on_pool_connect(self, dbapi_connection, connection_record) -> None:
+        with self._pool_lock:
+            self._pool_counts['connects'] += 1
+
+    def _on_pool_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        with self._pool_lock:
+            self._pool_counts['checkouts'] += 1
+            self._checked_out_since[id(connection_record)] = time.monotonic()
+
+    def _on_pool_checkin(self, dbapi_connection, connection_record) -> None:
+        # Also bound to 'close', so a connection closed while checked out
+        # (invalidated, recycled) is not left behind as "held".
+        with self._pool_lock:
+            if self._checked_out_since.pop(id(connection_record), None) is not None:
+                self._pool_counts['checkins'] += 1
+
+    def get_pool_stats(self, leak_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """Connection pool snapshot: size/idle/in-use/overflow, lifetime
+        connect/checkout/checkin counts, and leak signals. held_too_long counts
+        connections checked out for over leak_seconds (default DB_LEAK_SECONDS);
+        saturated means every pool and overflow slot is in use."""
+        if leak_seconds is None:
+            leak_seconds = DB_LEAK_SECONDS
+        pool = self.engine.pool
+        now = time.monotonic()
+        with self._pool_lock:
+            counts = dict(self._pool_counts)
+            held = [now - since for since in self._checked_out_since.values()]
+        checked_out = pool.checkedout()
+        return {
+            'size': pool.size(),
+            'max_overflow': self.max_overflow,
+            'checked_in': pool.checkedin(),
+            'checked_out': checked_out,
+            'overflow': pool.overflow(),
+            **counts,
+            'oldest_checkout_seconds': round(max(held), 3) if held else 0,
+            'held_too_long': sum(1 for age in held if age > leak_seconds),
+            'saturated': checked_out >= pool.size() + self.max_overflow,
+        }
+
+    def close(self) -> None:
+        """Close every pooled connection (application shutdown)."""
+        self.Session.remove()
+        self.engine.dispose()
 
     def _session(self):
+        conn = self._pinned_connection.get()
+        if conn is not None:
+            return Session(bind=conn)
         return self.Session()
 
+    @contextmanager
+    def connection(self):
+        """Check out one pooled connection and run every call made inside the
+        block on it, instead of an acquire/release cycle per call. Each call
+        still commits its own transaction. Keep slow non-DB work (LLM calls)
+        outside the block so the connection goes back to the pool."""
+        if self._pinned_connection.get() is not None:
+            yield
+            return
+        with self.engine.connect() as conn:
+            token = self._pinned_connection.set(conn)
+            try:
+                yield
+            finally:
+                self._pinned_connection.reset(token)
+
+    def _is_postgres(self) -> bool:
+        return self.engine.dialect.name == 'postgresql'
+
+    def _insert(self, model):
+        """Dialect INSERT construct with ON CONFLICT support (Postgres, or SQLite in local dev)."""
+        dialect_insert = pg_insert if self._is_postgres() else sqlite_insert
+        return dialect_insert(model)
+
+    def _with_retry(self, work):
+        """Run work(session) in one transaction, retrying transient
+        connection failures with a short backoff. Only failures before COMMIT
+        are retried: a connection lost during COMMIT may have committed on the
+        server, and replaying the work would write it twice. Blocking; call it
+        from a worker thread in async code."""
+        for attempt in range(1, DB_WRITE_ATTEMPTS + 1):
+            session = self._session()
+            try:
+                try:
+                    result = work(session)
+                except OperationalError as e:
+                    session.rollback()
+                    if attempt == DB_WRITE_ATTEMPTS:
+                        raise
+                    logger.warning("Transient DB error (attempt %s/%s): %s", attempt, DB_WRITE_ATTEMPTS, e)
+                else:
+                    session.commit()
+                    return result
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+            time.sleep(DB_RETRY_BACKOFF * attempt)
+
+    @staticmethod
+    def _payload(value):
+        """A JSON column value as Python data. The engine's json_deserializer
+        (orjson) already decodes JSONB; text values from older rows are parsed here."""
+        return json_codec.loads(value) if isinstance(value, str) else value
+
     # User languages
     def get_user_language(self, user_id: int) -> str:
+        language = self._language_cache.get(user_id)
+        if language is not None:
+            return language
         session = self._session()
         try:
-            row = session.query(UserLanguage).get(user_id)
-            return row.language if row else 'ru'
+            # Column-only reads skip ORM entity construction on the hot paths.
+            language = session.execute(
+                select(UserLanguage.language).where(UserLanguage.user_id == user_id)
+            ).scalar() or 'ru'
         finally:
             session.close()
+        self._language_cache.set(user_id, language)
+        return language
 
     def set_user_language(self, user_id: int, language: str) -> None:
+        # Always written: the cache may be stale when another instance changed
+        # the language, so it cannot prove the stored value is current.
         session = self._session()
         try:
-            row = session.query(UserLanguage).get(user_id)
-            if row:
-                row.language = language
+            # One upsert round trip; the WHERE turns an unchanged language into a no-op.
+            stmt = self._insert(UserLanguage).values(user_id=user_id, language=language)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[UserLanguage.user_id],
+                set_={'language': stmt.excluded.language, 'updated_at': func.now()},
+                where=UserLanguage.language != stmt.excluded.language,
+            )
+            session.execute(stmt)
+            session.commit()
+            self._language_cache.set(user_id, language)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def switch_user_language(self, user_id: int, language: str) -> str:
+        """Store language and return the previous one ('ru' for a new user) in a
+        single round trip: the upsert returns a row only when it inserted or
+        changed something, carrying the pre-statement value from a CTE."""
+        session = self._session()
+        try:
+            old = select(UserLanguage.language).where(UserLanguage.user_id == user_id)
+            stmt = self._insert(UserLanguage).values(user_id=user_id, language=language)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[UserLanguage.user_id],
+                set_={'language': stmt.excluded.language, 'updated_at': func.now()},
+                where=UserLanguage.language != stmt.excluded.language,
+            )
+            if self._is_postgres():
+                # The CTE reads the statement snapshot, i.e. the row before the upsert.
+                old = old.cte('old_language')
+                stmt = stmt.add_cte(old).returning(select(old.c.language).scalar_subquery())
+                row = session.execute(stmt).first()
+                previous = language if row is None else row[0]
             else:
-                row = UserLanguage(user_id=user_id, language=language)
-                session.add(row)
+                # SQLite evaluates the RETURNING subquery after the write, so
+                # read first (dev fallback only).
+                previous = session.execute(old).scalar()
+                session.execute(stmt)
             session.commit()
         except Exception:
             session.rollback()
             raise
         finally:
             session.close()
+        self._language_cache.set(user_id, language)
+        return previous or 'ru'
 
     # Pro subscription (trial / paid). Status is computed in app.compute_pro_status;
     # the DB layer only stores and returns raw rows.
     def get_pro_row(self, user_id: int) -> Optional[Dict[str, Any]]:
         session = self._session()
         try:
-            row = session.query(UserPro).get(user_id)
+            row = session.execute(
+                select(UserPro.plan, UserPro.is_pro, UserPro.trial_ends_at, UserPro.paid_until)
+                .where(UserPro.user_id == user_id)
+            ).first()
             if not row:
                 return None
             return {
@@ -112,10 +410,13 @@ class PostgresDatabaseManager:
         (the trial is granted once, никогда повторно)."""
         session = self._session()
         try:
-            if session.query(UserPro).get(user_id):
-                return
-            session.add(UserPro(user_id=user_id, is_pro=True, plan='trial',
-                                trial_ends_at=datetime.now() + timedelta(days=days)))
+            # Insert-if-absent in one statement: no existence query first, and two
+            # concurrent first opens cannot race into a duplicate-key error.
+            stmt = self._insert(UserPro).values(
+                user_id=user_id, is_pro=True, plan='trial',
+                trial_ends_at=datetime.now() + timedelta(days=days),
+            ).on_conflict_do_nothing(index_elements=[UserPro.user_id])
+            session.execute(stmt)
             session.commit()
         except Exception:
             session.rollback()
@@ -258,10 +559,10 @@ class PostgresDatabaseManager:
     def get_active_list(self, user_id: int) -> Optional[Dict[str, Any]]:
         session = self._session()
         try:
-            row = session.query(ActiveList).get(user_id)
-            if row:
-                return json.loads(row.list_data) if isinstance(row.list_data, str) else row.list_data
-            return None
+            list_data = session.execute(
+                select(ActiveList.list_data).where(ActiveList.user_id == user_id)
+            ).scalar()
+            return self._payload(list_data) if list_data is not None else None
         finally:
             session.close()
 
@@ -271,14 +572,14 @@ class PostgresDatabaseManager:
             list_id = list_data.get('list_id') or list_data.get('listid') or None
             if not list_id:
                 list_id = (list_data.get('list_id') or '')
-            row = session.query(ActiveList).get(user_id)
-            payload = list_data
-            if row:
-                row.list_id = list_id
-                row.list_data = payload
-            else:
-                row = ActiveList(user_id=user_id, list_id=list_id, list_data=payload)
-                session.add(row)
+            # One upsert round trip instead of SELECT + INSERT/UPDATE per save.
+            stmt = self._insert(ActiveList).values(user_id=user_id, list_id=list_id, list_data=list_data)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ActiveList.user_id],
+                set_={'list_id': stmt.excluded.list_id, 'list_data': stmt.excluded.list_data,
+                      'updated_at': func.now()},
+            )
+            session.execute(stmt)
             session.commit()
         except Exception:
             session.rollback()
@@ -289,10 +590,9 @@ class PostgresDatabaseManager:
     def delete_active_list(self, user_id: int) -> None:
         session = self._session()
         try:
-            row = session.query(ActiveList).get(user_id)
-            if row:
-                session.delete(row)
-                session.commit()
+            # One DELETE; no need to load the list JSONB just to remove it.
+            session.execute(ActiveList.__table__.delete().where(ActiveList.user_id == user_id))
+            session.commit()
         except Exception:
             session.rollback()
             raise
@@ -300,17 +600,23 @@ class PostgresDatabaseManager:
             session.close()
 
     # Shared lists
-    def create_shared_list(self, list_id: str, list_data: Dict[str, Any], owner_id: int, lang: str, expires_days: Optional[int] = None) -> None:
+    def create_shared_list(self, list_id: str, list_data: Dict[str, Any], owner_id: int, lang: str, expires_days: Optional[int] = None) -> bool:
         """Create a shared list. If expires_days is None the shared list is permanent.
+        Returns False (and writes nothing) if list_id is already taken, so callers
+        learn about a collision from the insert itself.
         """
         session = self._session()
         try:
             expires_at = None
             if isinstance(expires_days, int):
                 expires_at = datetime.now() + timedelta(days=expires_days)
-            row = SharedList(list_id=list_id, list_data=list_data, owner_id=owner_id, lang=lang, expires_at=expires_at)
-            session.add(row)
+            stmt = self._insert(SharedList).values(
+                list_id=list_id, list_data=list_data, owner_id=owner_id, lang=lang,
+                expires_at=expires_at, storage_version=1,
+            ).on_conflict_do_nothing(index_elements=[SharedList.list_id]).returning(SharedList.list_id)
+            created = session.execute(stmt).first() is not None
             session.commit()
+            return created
         except Exception:
             session.rollback()
             raise
@@ -320,7 +626,10 @@ class PostgresDatabaseManager:
     def get_shared_list(self, list_id: str) -> Optional[Dict[str, Any]]:
         session = self._session()
         try:
-            row = session.query(SharedList).get(list_id)
+            row = session.execute(
+                select(SharedList.list_data, SharedList.owner_id, SharedList.lang, SharedList.expires_at)
+                .where(SharedList.list_id == list_id)
+            ).first()
             if row and (row.expires_at is None or row.expires_at > datetime.now()):
                 return {'list_data': row.list_data, 'owner_id': row.owner_id, 'lang': row.lang}
             return None
@@ -363,14 +672,14 @@ class PostgresDatabaseManager:
             else:
                 row = UserHistory(user_id=user_id, list_id=list_id, list_data=list_data)
                 session.add(row)
-            # keep last 50
+            session.flush()
+            # keep last 50: one set-based DELETE instead of loading every entry
+            newest = (select(UserHistory.id).where(UserHistory.user_id == user_id)
+                      .order_by(UserHistory.created_at.desc()).limit(50).scalar_subquery())
+            session.query(UserHistory) \
+                .filter(UserHistory.user_id == user_id, UserHistory.id.not_in(newest)) \
+                .delete(synchronize_session=False)
             session.commit()
-            # delete older entries
-            rows = session.query(UserHistory).filter_by(user_id=user_id).order_by(UserHistory.created_at.desc()).all()
-            if len(rows) > 50:
-                for r in rows[50:]:
-                    session.delete(r)
-                session.commit()
         except Exception:
             session.rollback()
             raise
@@ -381,21 +690,24 @@ class PostgresDatabaseManager:
         """Get a specific history entry by user_id and list_id"""
         session = self._session()
         try:
-            row = session.query(UserHistory).filter_by(user_id=user_id, list_id=list_id).first()
+            row = session.execute(
+                select(UserHistory.list_data)
+                .where(UserHistory.user_id == user_id, UserHistory.list_id == list_id).limit(1)
+            ).first()
             if not row:
                 return None
-            normalized = json.loads(row.list_data) if isinstance(row.list_data, str) else row.list_data
-            return normalized
+            return self._payload(row.list_data)
         finally:
             session.close()
 
     def get_user_history(self, user_id: int):
         session = self._session()
         try:
-            rows = session.query(UserHistory).filter_by(user_id=user_id).order_by(UserHistory.created_at.desc()).all()
+            rows = session.query(UserHistory.list_id, UserHistory.created_at, UserHistory.list_data) \
+                .filter_by(user_id=user_id).order_by(UserHistory.created_at.desc()).all()
             result = []
             for row in rows:
-                normalized = json.loads(row.list_data) if isinstance(row.list_data, str) else row.list_data
+                normalized = self._payload(row.list_data)
                 # Flatten list_data to top-level fields expected by frontend
                 entry = {
                     'list_id': row.list_id,
@@ -422,25 +734,29 @@ class PostgresDatabaseManager:
         themselves, for in-place rewrites (e.g. language translation)."""
         session = self._session()
         try:
-            rows = session.query(UserHistory).filter_by(user_id=user_id).all()
+            rows = session.query(UserHistory.list_id, UserHistory.list_data).filter_by(user_id=user_id).all()
             result = []
             for row in rows:
-                data = json.loads(row.list_data) if isinstance(row.list_data, str) else row.list_data
+                data = self._payload(row.list_data)
                 if isinstance(data, dict):
                     result.append((row.list_id, data))
             return result
         finally:
             session.close()
 
-    def update_history_entry(self, user_id: int, list_id: str, list_data: Dict[str, Any]) -> None:
-        """Replace a history entry's payload without touching created_at
-        (unlike add_history_entry, which re-dates the entry)."""
+    def update_history_entries(self, user_id: int, entries: Dict[str, Dict[str, Any]]) -> None:
+        """Replace the payloads of several history entries ({list_id: list_data})
+        in one query and one commit, without touching created_at (unlike
+        add_history_entry, which re-dates the entry)."""
+        if not entries:
+            return
         session = self._session()
         try:
-            row = session.query(UserHistory).filter_by(user_id=user_id, list_id=list_id).first()
-            if row:
-                row.list_data = list_data
-                session.commit()
+            rows = session.query(UserHistory) \
+                .filter(UserHistory.user_id == user_id, UserHistory.list_id.in_(list(entries))).all()
+            for row in rows:
+                row.list_data = entries[row.list_id]
+            session.commit()
         except Exception:
             session.rollback()
             raise
@@ -474,32 +790,11 @@ class PostgresDatabaseManager:
             session.close()
 
     # Receipts (Premium receipt scanning)
-    def save_receipt(self, user_id: int, receipt: Dict[str, Any]) -> int:
-        """Persist a normalized receipt; returns the new receipt id."""
-        session = self._session()
-        try:
-            row = Receipt(
-                user_id=user_id,
-                store=receipt.get('store', ''),
-                purchase_date=receipt.get('date', ''),
-                currency=receipt.get('currency', ''),
-                total=float(receipt.get('total') or 0),
-                items=receipt.get('items', []),
-            )
-            session.add(row)
-            session.commit()
-            return row.id
-        except Exception:
-            session.rollback()
-            raise
-        finally:
-            session.close()
-
     @staticmethod
     def _receipt_to_dict(row) -> Dict[str, Any]:
         items = row.items
         if isinstance(items, str):
-            items = json.loads(items)
+            items = json_codec.loads(items)
         return {
             'id': row.id,
             'store': row.store or '',
@@ -518,6 +813,49 @@ class PostgresDatabaseManager:
         finally:
             session.close()
 
+    def get_receipt_totals(self, user_id: int) -> Dict[str, Any]:
+        """Receipt count, total spend, newest receipt id and the newest receipt's
+        currency in one aggregate statement, without loading any receipt."""
+        newest_currency = (select(Receipt.currency)
+                           .where(Receipt.user_id == user_id)
+                           .order_by(Receipt.created_at.desc(), Receipt.id.desc())
+                           .limit(1).scalar_subquery())
+        session = self._session()
+        try:
+            count, total, last_id, currency = session.execute(
+                select(func.count(Receipt.id), func.sum(Receipt.total), func.max(Receipt.id), newest_currency)
+                .where(Receipt.user_id == user_id)
+            ).one()
+            return {'count': count or 0, 'total': float(total or 0), 'last_id': last_id,
+                    'currency': currency or ''}
+        finally:
+            session.close()
+
+    def get_receipt_totals_and_items(self, user_id: int) -> Tuple[Dict[str, Any], list]:
+        """get_receipt_totals() plus the items JSON of every receipt (newest
+        first), in one statement: the aggregates ride along as window columns."""
+        session = self._session()
+        try:
+            rows = session.execute(
+                select(Receipt.items, Receipt.currency,
+                       func.count(Receipt.id).over(), func.sum(Receipt.total).over(),
+                       func.max(Receipt.id).over())
+                .where(Receipt.user_id == user_id)
+                .order_by(Receipt.created_at.desc(), Receipt.id.desc())
+            ).all()
+        finally:
+            session.close()
+        if not rows:
+            return {'count': 0, 'total': 0.0, 'last_id': None, 'currency': ''}, []
+        _, currency, count, total, last_id = rows[0]
+        receipts_items = []
+        for items, *_ in rows:
+            if isinstance(items, str):
+                items = json_codec.loads(items)
+            receipts_items.append(items or [])
+        totals = {'count': count, 'total': float(total or 0), 'last_id': last_id, 'currency': currency or ''}
+        return totals, receipts_items
+
     def get_receipt(self, user_id: int, receipt_id: int) -> Optional[Dict[str, Any]]:
         session = self._session()
         try:
@@ -526,49 +864,60 @@ class PostgresDatabaseManager:
         finally:
             session.close()
 
-    def update_receipt_items(self, receipt_id: int, items) -> None:
-        """Rewrite a receipt's items JSON (e.g. bilingual name backfill)."""
+    def update_receipts_items(self, items_by_id: Dict[int, Any]) -> None:
+        """Rewrite the items JSON of several receipts ({receipt_id: items}, e.g.
+        bilingual name backfill) as one executemany UPDATE by primary key."""
+        if not items_by_id:
+            return
         session = self._session()
         try:
-            row = session.query(Receipt).get(receipt_id)
-            if row:
-                row.items = items
-                session.commit()
+            session.execute(update(Receipt),
+                            [{'id': receipt_id, 'items': items} for receipt_id, items in items_by_id.items()])
+            session.commit()
         except Exception:
             session.rollback()
             raise
         finally:
             session.close()
 
+    def save_receipt_with_history(self, user_id: int, receipt: Dict[str, Any]) -> Tuple[int, int]:
+        """Persist a receipt and its purchase history rows in one transaction;
+        returns (receipt id, history row count)."""
+        def work(session):
+            receipt_id = session.execute(
+                insert(Receipt).returning(Receipt.id),
+                {
+                    'user_id': user_id,
+                    'store': receipt.get('store', ''),
+                    'purchase_date': receipt.get('date', ''),
+                    'currency': receipt.get('currency', ''),
+                    'total': float(receipt.get('total') or 0),
+                    'items': receipt.get('items', []),
+                },
+            ).scalar_one()
+            rows = self._purchase_history_rows(user_id, receipt_id, receipt)
+            if rows:
+                session.execute(insert(PurchaseHistoryItem), rows)
+            return receipt_id, len(rows)
+        return self._with_retry(work)
+
     # Purchase history (per-item; foundation for repeat purchases / recommendations)
-    def add_purchase_history_items(self, user_id: int, receipt_id: Optional[int], receipt: Dict[str, Any]) -> int:
-        """Append every receipt item to the user's purchase history. Returns count."""
-        session = self._session()
-        try:
-            count = 0
-            for item in receipt.get('items', []):
-                session.add(PurchaseHistoryItem(
-                    user_id=user_id,
-                    receipt_id=receipt_id,
-                    name=item.get('name', ''),
-                    name_ru=item.get('name_ru') or item.get('name', ''),
-                    name_uz=item.get('name_uz') or None,
-                    category=item.get('category', 'Другое'),
-                    quantity=float(item.get('quantity') or 1),
-                    unit=item.get('unit', 'шт'),
-                    price=float(item.get('price') or 0),
-                    currency=receipt.get('currency', ''),
-                    store=receipt.get('store', ''),
-                    purchase_date=receipt.get('date', ''),
-                ))
-                count += 1
-            session.commit()
-            return count
-        except Exception:
-            session.rollback()
-            raise
-        finally:
-            session.close()
+    @staticmethod
+    def _purchase_history_rows(user_id: int, receipt_id: Optional[int], receipt: Dict[str, Any]):
+        return [{
+            'user_id': user_id,
+            'receipt_id': receipt_id,
+            'name': item.get('name', ''),
+            'name_ru': item.get('name_ru') or item.get('name', ''),
+            'name_uz': item.get('name_uz') or None,
+            'category': item.get('category', 'Другое'),
+            'quantity': float(item.get('quantity') or 1),
+            'unit': item.get('unit', 'шт'),
+            'price': float(item.get('price') or 0),
+            'currency': receipt.get('currency', ''),
+            'store': receipt.get('store', ''),
+            'purchase_date': receipt.get('date', ''),
+        } for item in receipt.get('items', [])]
 
     def get_purchase_history(self, user_id: int, limit: int = 200):
         session = self._session()
@@ -595,18 +944,24 @@ class PostgresDatabaseManager:
         finally:
             session.close()
 
-    def update_purchase_item_names(self, item_id: int, name_ru: Optional[str] = None,
-                                   name_uz: Optional[str] = None) -> None:
-        """Backfill bilingual names on a purchase history row."""
+    def update_purchase_item_names(self, names: Dict[int, Tuple[Optional[str], Optional[str]]]) -> None:
+        """Backfill bilingual names on purchase history rows ({id: (name_ru, name_uz)})
+        as executemany UPDATEs by primary key, without loading the rows."""
+        params = []
+        for row_id, (name_ru, name_uz) in names.items():
+            values = {'id': row_id}
+            if name_ru:
+                values['name_ru'] = name_ru
+            if name_uz:
+                values['name_uz'] = name_uz
+            if len(values) > 1:
+                params.append(values)
+        if not params:
+            return
         session = self._session()
         try:
-            row = session.query(PurchaseHistoryItem).get(item_id)
-            if row:
-                if name_ru:
-                    row.name_ru = name_ru
-                if name_uz:
-                    row.name_uz = name_uz
-                session.commit()
+            session.execute(update(PurchaseHistoryItem), params)
+            session.commit()
         except Exception:
             session.rollback()
             raise
@@ -20,13 +20,19 @@ class SharedList(Base):
     owner_id = Column(Integer, nullable=False)
     lang = Column(String(8), default='ru')
     created_at = Column(DateTime, server_default=func.now())
-    expires_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True, index=True)
     storage_version = Column(Integer, default=1)
 
 class UserHistory(Base):
     __tablename__ = 'user_history'
+    # History is always read per user, newest first, or by (user, list_id).
+    # The composites lead with user_id, so no separate user_id index is kept.
+    __table_args__ = (
+        Index('ix_user_history_user_created', 'user_id', 'created_at'),
+        Index('ix_user_history_user_list', 'user_id', 'list_id'),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
     list_id = Column(String(128), nullable=False)
     list_data = Column(JSONB, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
@@ -42,8 +48,15 @@ class Receipt(Base):
     """A scanned store receipt (Premium 'Сканирование чека'). Items are stored
     as structured JSON already normalized/categorized by the vision pipeline."""
     __tablename__ = 'receipts'
+    # Receipts are read per user, newest first; total/currency are carried in
+    # the index so the analytics count/sum/currency reads are index-only scans.
+    # It leads with user_id, so no separate user_id index is kept.
+    __table_args__ = (
+        Index('ix_receipts_user_created', 'user_id', 'created_at',
+              postgresql_include=['total', 'currency']),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
     store = Column(String(255), default='')
     purchase_date = Column(String(32), default='')
     currency = Column(String(16), default='')
@@ -106,8 +119,12 @@ class PurchaseHistoryItem(Base):
     """One purchased product, denormalized per item so future features
     (repeat purchases, 'buy again', AI recommendations) can query directly."""
     __tablename__ = 'purchase_history'
+    # Leads with user_id, so no separate user_id index is kept.
+    __table_args__ = (
+        Index('ix_purchase_history_user_created', 'user_id', 'created_at'),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
     receipt_id = Column(Integer, nullable=True, index=True)
     name = Column(String(255), nullable=False)
     # Bilingual product names so the UI can switch language without losing data.
@@ -121,3 +138,10 @@ class PurchaseHistoryItem(Base):
     store = Column(String(255), default='')
     purchase_date = Column(String(32), default='')
     created_at = Column(DateTime, server_default=func.now())
+
+
+class SchemaVersion(Base):
+    """Single-row stamp of the schema revision the DDL/upgrade steps last ran
+    for; startup skips all introspection when it matches SCHEMA_VERSION."""
+    __tablename__ = 'schema_version'
+    version = Column(Integer, primary_key=True)
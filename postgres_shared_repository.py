@@ -6,6 +6,12 @@ class PostgresSharedListRepository:
         self.db = db
 
     def save(self, token: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        created = self.create(token, record)
+        if created is None:
+            raise ValueError(f"Shared list {token} already exists")
+        return created
+
+    def create(self, token: str, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         # record expected to contain owner_id, lang, list_data, expires_at
         owner = record.get('owner_id', 0)
         lang = record.get('lang', 'ru')
@@ -20,7 +26,10 @@ class PostgresSharedListRepository:
                 expires = None
         except Exception:
             expires = None
-        self.db.create_shared_list(token, payload, owner, lang, expires_days=expires)
+        # Insert-if-absent: a taken token comes back as None from this single
+        # statement instead of needing a separate existence query first.
+        if not self.db.create_shared_list(token, payload, owner, lang, expires_days=expires):
+            return None
         return record
 
     def get(self, token: str) -> Optional[Dict[str, Any]]:
@@ -12,13 +12,48 @@ Future PostgreSQL mapping example:
 from __future__ import annotations
 
 import copy
-import json
+import os
 import secrets
+import stat
+import tempfile
 import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Dict, Optional, Protocol
 
+try:
+    from mini_app import json_codec
+except ImportError:
+    import json_codec
+
+
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Write data with one binary write to a uniquely named temp file in the same
+    directory, then os.replace it over path — readers never see a torn file and
+    concurrent writers (several workers) never share a temp file. An existing
+    file keeps its permissions (mkstemp creates the temp file as 0600)."""
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        try:
+            os.chmod(temp_name, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except OSError:
+            pass
+        raise
+
+
+def _is_naive_isoformat(value: str) -> bool:
+    """True for strings shaped like naive datetime.isoformat() output
+    (YYYY-MM-DDTHH:MM:SS with optional .ffffff), which sort chronologically."""
+    return len(value) in (19, 26) and value[10:11] == "T" and value[19:20] in ("", ".")
+
 
 class SharedListRepository(Protocol):
     def save(self, token: str, record: Dict[str, Any]) -> Dict[str, Any]:
@@ -27,6 +62,10 @@ class SharedListRepository(Protocol):
     def get(self, token: str) -> Optional[Dict[str, Any]]:
         ...
 
+    def create(self, token: str, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Save record only if token is free; None when it is already taken."""
+        ...
+
     def delete_expired(self) -> int:
         ...
 
@@ -60,8 +99,7 @@ class JsonSharedListRepository:
     def _read_state(self) -> Dict[str, Any]:
         if not self.file_path.exists():
             return {"version": 1, "shared_lists": {}}
-        with self.file_path.open("r", encoding="utf-8") as file:
-            state = json.load(file)
+        state = json_codec.loads(self.file_path.read_bytes())
         if "shared_lists" not in state or not isinstance(state["shared_lists"], dict):
             state["shared_lists"] = {}
         if "version" not in state:
@@ -69,10 +107,7 @@ class JsonSharedListRepository:
         return state
 
     def _write_state(self, state: Dict[str, Any]) -> None:
-        temp_path = self.file_path.with_suffix(self.file_path.suffix + ".tmp")
-        with temp_path.open("w", encoding="utf-8") as file:
-            json.dump(state, file, ensure_ascii=False, indent=2)
-        temp_path.replace(self.file_path)
+        _atomic_write_bytes(self.file_path, json_codec.dumps_bytes(state, indent=True))
 
     def save(self, token: str, record: Dict[str, Any]) -> Dict[str, Any]:
         with self._lock:
@@ -87,16 +122,33 @@ class JsonSharedListRepository:
             record = state.get("shared_lists", {}).get(token)
             return copy.deepcopy(record) if record else None
 
+    def create(self, token: str, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self._read_state()
+            if token in state["shared_lists"]:
+                return None
+            state["shared_lists"][token] = copy.deepcopy(record)
+            self._write_state(state)
+            return copy.deepcopy(record)
+
     def delete_expired(self) -> int:
         with self._lock:
             state = self._read_state()
             shared_lists = state.get("shared_lists", {})
             now = datetime.now()
+            now_iso = now.isoformat()
             removed = 0
             for token, record in list(shared_lists.items()):
                 expires_at = record.get("expires_at")
                 if not expires_at:
                     continue
+                # Timestamps written by create_shared_snapshot compare as plain
+                # strings; only hand-edited/foreign formats need parsing.
+                if _is_naive_isoformat(expires_at):
+                    if expires_at <= now_iso:
+                        del shared_lists[token]
+                        removed += 1
+                    continue
                 try:
                     if datetime.fromisoformat(expires_at) <= now:
                         del shared_lists[token]
@@ -124,37 +176,39 @@ class SharedListService:
         expires_days: int = 7,
         live: bool = False,
     ) -> Dict[str, Any]:
-        snapshot = copy.deepcopy(list_data)
-        token = self.generate_unique_token()
-        while self.repository.get(token) is not None:
-            token = self.generate_unique_token()
-
         created_at = datetime.now().isoformat()
         expires_at = (datetime.now() + timedelta(days=expires_days)).isoformat()
 
-        snapshot["list_id"] = snapshot.get("list_id") or token
-        snapshot["created_at"] = snapshot.get("created_at") or created_at
-        snapshot["is_shared_snapshot"] = True
-        snapshot["original_owner_id"] = owner_id
-        snapshot["shared_token"] = token
-        if live:
-            # Pro family sync: the link resolves to the owner's ACTIVE list while
-            # it is still the same list; the snapshot stays as a static fallback.
-            snapshot["live_sync"] = True
-            snapshot["source_list_id"] = snapshot.get("list_id")
-
-        record = {
-            "token": token,
-            "owner_id": owner_id,
-            "lang": lang,
-            "created_at": created_at,
-            "expires_at": expires_at,
-            "storage_type": "json",
-            "storage_version": 1,
-            "list_data": snapshot,
-        }
-
-        return self.repository.save(token, record)
+        # The repository reports a token collision from the insert itself, so
+        # there is no separate existence check; on a clash draw a new token.
+        while True:
+            token = self.generate_unique_token()
+            snapshot = copy.deepcopy(list_data)
+            snapshot["list_id"] = snapshot.get("list_id") or token
+            snapshot["created_at"] = snapshot.get("created_at") or created_at
+            snapshot["is_shared_snapshot"] = True
+            snapshot["original_owner_id"] = owner_id
+            snapshot["shared_token"] = token
+            if live:
+                # Pro family sync: the link resolves to the owner's ACTIVE list while
+                # it is still the same list; the snapshot stays as a static fallback.
+                snapshot["live_sync"] = True
+                snapshot["source_list_id"] = snapshot.get("list_id")
+
+            record = {
+                "token": token,
+                "owner_id": owner_id,
+                "lang": lang,
+                "created_at": created_at,
+                "expires_at": expires_at,
+                "storage_type": "json",
+                "storage_version": 1,
+                "list_data": snapshot,
+            }
+
+            created = self.repository.create(token, record)
+            if created is not None:
+                return created
 
     def get_shared_snapshot(self, token: str) -> Optional[Dict[str, Any]]:
         return self.repository.get(token)
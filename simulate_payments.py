@@ -40,6 +40,24 @@ USER_ID = int(os.getenv("SIM_USER_ID", "990077"))
 PAYME_KEY = os.getenv("PAYME_TEST_KEY") or os.getenv("PAYME_KEY", "")
 CLICK_SERVICE_ID = os.getenv("CLICK_SERVICE_ID", "")
 CLICK_SECRET_KEY = os.getenv("CLICK_SECRET_KEY", "")
+# Отчёт копится и выводится одним write в конце (успех или ошибка);
+# VERBOSE=1 печатает каждую строку сразу, для отладки по ходу прогона.
+VERBOSE = bool(os.getenv("VERBOSE"))
+_report = []
+
+
+def say(line: str):
+    if VERBOSE:
+        print(line, flush=True)
+    else:
+        _report.append(line)
+
+
+def flush_report():
+    if _report:
+        sys.stdout.write("\n".join(_report) + "\n")
+        sys.stdout.flush()
+        _report.clear()
 
 
 def http(method: str, path: str, json_body=None, form_body=None, headers=None):
@@ -61,7 +79,7 @@ def http(method: str, path: str, json_body=None, form_body=None, headers=None):
 
 
 def check(name: str, ok: bool, detail=""):
-    print(f"  {'✅' if ok else '❌'} {name}" + (f" — {detail}" if detail else ""))
+    say(f"  {'✅' if ok else '❌'} {name}" + (f" — {detail}" if detail else ""))
     if not ok:
         sys.exit(1)
 
@@ -74,11 +92,11 @@ def payme_call(method: str, params: dict, rpc_id: int = 1):
 
 
 def simulate_payme():
-    print("\n— Payme Merchant API —")
+    say("\n— Payme Merchant API —")
     d = http("POST", f"/api/pro/{USER_ID}/checkout", json_body={"provider": "payme"})
     check("checkout: заказ создан", d.get("success"), d.get("error", ""))
     order_id, amount_tiyin = d["order_id"], d["amount"] * 100
-    print(f"     заказ #{order_id}, {d['amount']} сум, ссылка: {d['checkout_url'][:60]}…")
+    say(f"     заказ #{order_id}, {d['amount']} сум, ссылка: {d['checkout_url'][:60]}…")
 
     r = payme_call("CheckPerformTransaction", {"amount": amount_tiyin, "account": {"order_id": order_id}})
     check("CheckPerformTransaction → allow", r.get("result", {}).get("allow") is True, str(r.get("error", "")))
@@ -97,7 +115,7 @@ def simulate_payme():
 
 
 def simulate_click():
-    print("\n— Click SHOP API —")
+    say("\n— Click SHOP API —")
     d = http("POST", f"/api/pro/{USER_ID}/checkout", json_body={"provider": "click"})
     check("checkout: заказ создан", d.get("success"), d.get("error", ""))
     order_id = d["order_id"]
@@ -151,8 +169,11 @@ def main():
     check("после Click: подписка активна (plan=paid)", status.get("plan") == "paid",
           f"plan={status.get('plan')}, до {str(status.get('paid_until'))[:10]}")
 
-    print("\n🧡 Всё работает: оба протокола проводят оплату и активируют Pro.")
+    say("\n🧡 Всё работает: оба протокола проводят оплату и активируют Pro.")
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        flush_report()
@@ -17,7 +17,9 @@ These tests cover:
 """
 
 import sys
+import json
 import os
+import threading
 import unittest
 import unittest.mock as mock
 
@@ -65,6 +67,15 @@ _fastapi_stub.WebSocketDisconnect = Exception
 _fastapi_stub.Request = mock.MagicMock()
 _fastapi_middleware_stub = mock.MagicMock()
 _fastapi_responses_stub = mock.MagicMock()
+
+
+class _StubJSONResponse:
+    def __init__(self, content=None, status_code=200, **kwargs):
+        self.content = content
+        self.status_code = status_code
+
+
+_fastapi_responses_stub.JSONResponse = _StubJSONResponse  # app.py subclasses it, so it must be a real class
 _pydantic_stub = mock.MagicMock()
 _pydantic_stub.BaseModel = object  # classes that inherit from BaseModel must be real classes
 
@@ -492,6 +503,43 @@ class TestScoreMatchConfidence(unittest.TestCase):
 # Edit flow tests (deterministic patterns)
 # ──────────────────────────────────────────────────────────────────────────────
 
+class TestToggleItemPurchased(unittest.TestCase):
+    """Переключение одной покупки правит счётчики без полного пересчёта."""
+
+    def _list(self, purchased_items):
+        return {
+            "categories": {"🥕 Овощи": [{"name": "Лук", "purchased": False, "estimated_price": 5000},
+                                       {"name": "Морковь", "purchased": True, "estimated_price": 3000}]},
+            "total_items": 2, "purchased_items": purchased_items, "total_estimated_price": 8000,
+        }
+
+    def test_toggle_completes_list(self):
+        fn = _get("toggle_item_purchased_in_list")
+        data = fn(self._list(1), "🥕 Овощи", "Лук")
+        self.assertEqual(data["purchased_items"], 2)
+        self.assertTrue(data["all_purchased"])
+        self.assertTrue(data["needs_confirmation"])
+        data = fn(data, "🥕 Овощи", "Лук")
+        self.assertEqual(data["purchased_items"], 1)
+        self.assertFalse(data["all_purchased"])
+
+    def test_missing_counters_or_item_recount(self):
+        fn = _get("toggle_item_purchased_in_list")
+        data = self._list(1)
+        del data["purchased_items"]
+        self.assertEqual(fn(data, "🥕 Овощи", "Лук")["purchased_items"], 2)
+        self.assertEqual(fn(self._list(0), "🥕 Овощи", "Нет такого")["purchased_items"], 1)
+
+    def test_category_toggle_counts_only_flipped_items(self):
+        fn = _get("toggle_category_purchased_in_list")
+        data = fn(self._list(1), "🥕 Овощи")
+        self.assertEqual(data["purchased_items"], 2)
+        self.assertTrue(data["all_purchased"])
+        data = fn(data, "🥕 Овощи")
+        self.assertEqual(data["purchased_items"], 0)
+        self.assertFalse(data["needs_confirmation"])
+
+
 class TestApplyEditChanges(unittest.TestCase):
 
     def _fn(self):
@@ -538,6 +586,20 @@ class TestApplyEditChanges(unittest.TestCase):
         self.assertIsNotNone(potato, "Картошка should still be in list")
         self.assertIn("5", potato.get("quantity", ""), f"Qty should be updated to '5 кг', got {potato.get('quantity')!r}")
 
+    def test_changes_applied_in_place_case_insensitive(self):
+        fn = self._fn()
+        categories = self._base_categories()
+        categories["🥛 Молочные продукты"] = [{"name": "Молоко", "quantity": "1 л", "purchased": False}]
+        changes = [
+            {"action": "remove", "target": "картошка", "new_item": "", "quantity": ""},
+            {"action": "remove", "target": "БАНАНЫ", "new_item": "", "quantity": ""},
+            {"action": "update", "target": "МОЛОКО", "new_item": "", "quantity": "3 л"},
+        ]
+        result = fn(categories, changes, "ru")
+        self.assertIs(result, categories)
+        self.assertEqual(list(result), ["🥛 Молочные продукты"])
+        self.assertEqual(result["🥛 Молочные продукты"][0]["quantity"], "3 л")
+
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Number-word conversion (voice often returns "два" / "ikki" instead of digits)
@@ -557,6 +619,10 @@ class TestNumberWords(unittest.TestCase):
         fn = self._fn()
         self.assertEqual(fn("kartoshka ikki kilo"), "kartoshka 2 kilo")
 
+    def test_fraction_words(self):
+        fn = self._fn()
+        self.assertEqual(fn("yarim kilo"), "0.5 kilo")
+
     def test_leaves_real_words(self):
         fn = self._fn()
         # Should not touch unrelated words.
@@ -793,6 +859,15 @@ class TestSmartPriceMatching(unittest.TestCase):
         self.assertEqual(len(items), 1, f"Expected exactly 1 item for {text!r}, got {items}")
         return items[0]
 
+    def test_find_products_memoized_returns_fresh_list(self):
+        pdb = _app_module.price_db
+        first = pdb.find_products("картошка", "ru")
+        self.assertTrue(first)
+        first.clear()
+        second = pdb.find_products("картошка", "ru")
+        self.assertTrue(second)
+        self.assertEqual(second, pdb._find_products_uncached("картошка", "ru"))
+
     # ── synonyms → price ──────────────────────────────────────────────────────
 
     def test_kartofel_synonym_price_scaled(self):
@@ -1169,6 +1244,11 @@ class TestFamilyShareSnapshot(unittest.TestCase):
             def get(self, token):
                 return self.store.get(token)
 
+            def create(self, token, record):
+                if token in self.store:
+                    return None
+                return self.save(token, record)
+
             def delete_expired(self):
                 return 0
 
@@ -1196,6 +1276,47 @@ class TestFamilyShareSnapshot(unittest.TestCase):
         self.assertNotIn("live_sync", self.list_data)
 
 
+class TestSharedListExpiry(unittest.TestCase):
+    """JsonSharedListRepository: delete_expired сравнивает ISO-строки без парсинга,
+    перезапись файла сохраняет его права доступа."""
+
+    def test_removes_only_expired(self):
+        import tempfile
+        from datetime import datetime, timedelta
+        spec = importlib.util.spec_from_file_location(
+            "shared_storage_real", os.path.join(_HERE, "shared_storage.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        now = datetime.now()
+        with tempfile.TemporaryDirectory() as tmp:
+            repo = module.JsonSharedListRepository(os.path.join(tmp, "shared.json"))
+            repo.save("old", {"expires_at": (now - timedelta(days=1)).isoformat()})
+            repo.save("old_whole_sec", {"expires_at": (now - timedelta(days=1)).replace(microsecond=0).isoformat()})
+            repo.save("date_only", {"expires_at": "2000-01-01"})
+            repo.save("fresh", {"expires_at": (now + timedelta(days=1)).isoformat()})
+            repo.save("bad", {"expires_at": "someday"})
+            repo.save("none", {})
+            self.assertEqual(repo.delete_expired(), 3)
+            self.assertIsNone(repo.get("old"))
+            self.assertIsNotNone(repo.get("fresh"))
+            self.assertIsNotNone(repo.get("bad"))
+
+    def test_rewrite_keeps_file_permissions(self):
+        import stat
+        import tempfile
+        spec = importlib.util.spec_from_file_location(
+            "shared_storage_real", os.path.join(_HERE, "shared_storage.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "shared.json")
+            repo = module.JsonSharedListRepository(path)
+            repo.save("a", {})
+            os.chmod(path, 0o644)
+            repo.save("b", {})
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o644)
+
+
 class TestProSubscriptionStatus(unittest.TestCase):
     """compute_pro_status: триал 7 дней, оплаченная подписка, сервисный сбор.
     Сбор 2490 снимается только у АКТИВНОЙ оплаченной подписки — триал платит."""
@@ -1388,6 +1509,230 @@ class TestCategoryAssignment(unittest.TestCase):
                               f"[{lang}] {name!r}: expected *{expected}*, got {got!r}")
 
 
+class TestLocalEditRouting(unittest.TestCase):
+    """Простые команды «добавь …» разбираются локально, без GPT."""
+
+    def setUp(self):
+        self.route = _get("_route_edit_locally")
+
+    def test_add_ru(self):
+        self.assertEqual(self.route("добавь молоко 2 литра", "ru"),
+                         [{"action": "add", "new_item": "Молоко", "quantity": "2 л"}])
+
+    def test_add_uz(self):
+        changes = self.route("yana non qo'sh", "uz")
+        self.assertEqual([c["action"] for c in changes], ["add"])
+        self.assertEqual(changes[0]["new_item"].lower(), "non")
+
+    def test_mixed_or_long_goes_to_gpt(self):
+        self.assertEqual(self.route("убери хлеб и добавь молоко", "ru"), [])
+        self.assertEqual(self.route("добавь молока побольше, если будет свежее и недорогое сегодня", "ru"), [])
+        self.assertEqual(self.route("хлеб молоко", "ru"), [])
+
+    def test_detect_edit_changes_skips_gpt(self):
+        import asyncio
+        fake_client = mock.MagicMock()
+        fake_client.chat.completions.create = mock.AsyncMock()
+        with mock.patch.object(_app_module, "async_client", fake_client):
+            changes = asyncio.run(_get("detect_edit_changes")("добавь хлеб", "ru"))
+        self.assertEqual(changes[0]["action"], "add")
+        fake_client.chat.completions.create.assert_not_called()
+
+
+class TestLLMCache(unittest.TestCase):
+    """Одинаковые запросы к GPT отдаются из кэша, пока не истёк TTL."""
+
+    def setUp(self):
+        self.cache_cls = _get("LLMCache")
+
+    def test_hit_and_key_normalization(self):
+        cache = self.cache_cls(ttl=60)
+        key = self.cache_cls.make_key("list", "gpt-4o-mini", "ru", "хлеб, молоко")
+        self.assertIsNone(cache.get(key))
+        cache.set(key, "🥛 Молочные продукты:\n• Молоко")
+        same = self.cache_cls.make_key("list", "gpt-4o-mini", "ru", "  хлеб, молоко ")
+        self.assertEqual(cache.get(same), "🥛 Молочные продукты:\n• Молоко")
+        other_lang = self.cache_cls.make_key("list", "gpt-4o-mini", "uz", "хлеб, молоко")
+        self.assertIsNone(cache.get(other_lang))
+
+    def test_expired_entry_is_dropped(self):
+        cache = self.cache_cls(ttl=60)
+        with mock.patch.object(_app_module.time, "monotonic", return_value=1000.0):
+            cache.set("k", ["v"])
+        with mock.patch.object(_app_module.time, "monotonic", return_value=1061.0):
+            self.assertIsNone(cache.get("k"))
+
+    def test_oldest_entry_evicted_when_full(self):
+        cache = self.cache_cls(ttl=60, max_entries=2)
+        for key in ("a", "b", "c"):
+            cache.set(key, key)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), "c")
+
+
+class TestBoundedCache(unittest.TestCase):
+    """Общий кэш с лимитом: потокобезопасное вытеснение, кэширование None."""
+
+    def test_concurrent_writers_stay_bounded(self):
+        cache = _get("BoundedCache")(max_entries=64)
+        errors = []
+
+        def fill(offset):
+            try:
+                for i in range(2000):
+                    cache.set((offset, i), i)
+                    cache.get((offset, i - 1))
+            except Exception as e:  # pragma: no cover - the failure being tested
+                errors.append(e)
+
+        threads = [threading.Thread(target=fill, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(cache), 64)
+
+    def test_cached_none_differs_from_missing(self):
+        cache = _get("BoundedCache")(max_entries=2)
+        missing = object()
+        cache.set("no-match", None)
+        self.assertIsNone(cache.get("no-match", missing))
+        self.assertIs(cache.get("other", missing), missing)
+
+
+class TestStreamedCompletion(unittest.TestCase):
+    """Потоковый ответ GPT: строки отдаются по мере готовности, полный текст сохраняется."""
+
+    def test_lines_emitted_across_chunk_boundaries(self):
+        import asyncio
+        from types import SimpleNamespace
+
+        def chunk(text):
+            return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+        async def completion():
+            for piece in ("🥕 Ово", "щи:\n• Лук", " — 1 кг\n\n", None, "• Морковь"):
+                yield chunk(piece)
+            yield SimpleNamespace(choices=[])
+
+        lines = []
+
+        async def on_line(line):
+            lines.append(line)
+
+        text = asyncio.run(_get("_stream_completion_lines")(completion(), on_line))
+        self.assertEqual(lines, ["🥕 Овощи:", "• Лук — 1 кг", "• Морковь"])
+        self.assertEqual(text, "🥕 Овощи:\n• Лук — 1 кг\n\n• Морковь")
+
+
+class TestConnectionManager(unittest.TestCase):
+    """Менеджер WebSocket: переподключения и пакетная отправка."""
+
+    def test_stale_socket_does_not_evict_reconnect(self):
+        class Socket:
+            pass
+
+        manager = _get("ConnectionManager")()
+        old_ws, new_ws = Socket(), Socket()
+        manager.active_connections[5] = old_ws
+        manager.active_connections[5] = new_ws
+
+        manager.disconnect(5, old_ws)
+        self.assertIs(manager.active_connections.get(5), new_ws)
+
+        del new_ws
+        self.assertNotIn(5, manager.active_connections)
+
+    def test_queued_messages_coalesce_into_one_frame(self):
+        import asyncio
+        manager = _get("ConnectionManager")()
+        ws = mock.MagicMock()
+        ws.send_text = mock.AsyncMock()
+        manager.active_connections = {1: ws}
+
+        async def scenario():
+            for line in ("🥕 Овощи:", "• Лук", "• Морковь"):
+                manager.queue_message(1, {"type": "list_stream", "line": line})
+            await asyncio.sleep(0.1)
+            manager.queue_message(1, {"type": "pong"})
+            await manager.flush(1)
+
+        asyncio.run(scenario())
+        frames = [json.loads(c.args[0]) for c in ws.send_text.await_args_list]
+        self.assertEqual(frames[0]["type"], "batch")
+        self.assertEqual([m["line"] for m in frames[0]["items"]], ["🥕 Овощи:", "• Лук", "• Морковь"])
+        self.assertEqual(frames[1], {"type": "pong"})
+        self.assertEqual(manager.pending_messages, {})
+
+
+class TestReceiptAnalytics(unittest.TestCase):
+    """Аналитика чеков: суммы по категориям в одном проходе, локализация категорий."""
+
+    @staticmethod
+    def _fake_db(totals, receipts_items):
+        fake_db = mock.MagicMock()
+        fake_db.get_receipt_totals.return_value = totals
+        fake_db.get_receipt_totals_and_items.return_value = (totals, receipts_items)
+        fake_db.get_purchase_history.return_value = []
+        return fake_db
+
+    def test_by_category_merges_localized_names(self):
+        fake_db = self._fake_db({"count": 2, "total": 30000.0, "currency": "сум"}, [
+            [{"category": "Овощи", "price": 10000.5}, {"category": "Sabzavotlar", "price": 5000}],
+            [{"category": "Мясо", "price": 14999.5}, {"category": None, "price": None}],
+        ])
+        with mock.patch.object(_app_module, "db", fake_db), \
+                mock.patch.object(_app_module, "_receipt_category_sums", _get("BoundedCache")(16)):
+            result = _get("update_analytics")(1, "uz")
+
+        self.assertEqual(result["by_category"], {"Sabzavotlar": 15000.5, "Go'sht": 14999.5, "Boshqa": 0})
+        self.assertEqual(result["top_categories"][0]["category"], "Sabzavotlar")
+        self.assertEqual(result["average_receipt"], 15000.0)
+        # Cold cache: totals come with the items, no separate aggregate query.
+        fake_db.get_receipt_totals.assert_not_called()
+
+    def test_category_sums_reused_until_totals_change(self):
+        fake_db = self._fake_db({"count": 1, "total": 500.0, "currency": "сум"},
+                                [[{"category": "Мясо", "price": 500}]])
+        fn = _get("update_analytics")
+        with mock.patch.object(_app_module, "db", fake_db), \
+                mock.patch.object(_app_module, "_receipt_category_sums", _get("BoundedCache")(16)):
+            fn(7, "ru")
+            fn(7, "uz")
+            self.assertEqual(fake_db.get_receipt_totals_and_items.call_count, 1)
+            self.assertEqual(fake_db.get_receipt_totals.call_count, 1)
+
+            totals = {"count": 2, "total": 800.0, "currency": "сум"}
+            fake_db.get_receipt_totals.return_value = totals
+            fake_db.get_receipt_totals_and_items.return_value = (
+                totals, [[{"category": "Мясо", "price": 500}], [{"category": "Мясо", "price": 300}]])
+            result = fn(7, "ru")
+            self.assertEqual(fake_db.get_receipt_totals_and_items.call_count, 2)
+            self.assertEqual(result["by_category"], {"Мясо": 800})
+
+    def test_category_sums_recomputed_when_receipt_replaced(self):
+        # Same count and total, but a different receipt: the newest id changes.
+        fake_db = self._fake_db({"count": 1, "total": 500.0, "last_id": 1, "currency": "сум"},
+                                [[{"category": "Мясо", "price": 500}]])
+        fn = _get("update_analytics")
+        with mock.patch.object(_app_module, "db", fake_db), \
+                mock.patch.object(_app_module, "_receipt_category_sums", _get("BoundedCache")(16)):
+            fn(7, "ru")
+            totals = {"count": 1, "total": 500.0, "last_id": 2, "currency": "сум"}
+            fake_db.get_receipt_totals.return_value = totals
+            fake_db.get_receipt_totals_and_items.return_value = (totals, [[{"category": "Фрукты", "price": 500}]])
+            result = fn(7, "ru")
+        self.assertEqual(fake_db.get_receipt_totals_and_items.call_count, 2)
+        self.assertEqual(result["by_category"], {"Фрукты": 500})
+
+    def test_category_sums_cache_is_bounded(self):
+        cache = _app_module._receipt_category_sums
+        self.assertIsInstance(cache, _get("BoundedCache"))
+        self.assertNotIsInstance(cache, _get("LLMCache"))
+        self.assertEqual(cache._max_entries, _app_module._RECEIPT_SUMS_CACHE_SIZE)
+
+
 class TestRecipePricing(unittest.TestCase):
     """Цены ингредиентов рецептов = цена за единицу × количество."""
 
@@ -1474,5 +1819,125 @@ class TestRecipePricing(unittest.TestCase):
                              f"calculated {expected} from {best['name_ru']}")
 
 
+
+class TestDatabaseManager(unittest.TestCase):
+    """Настоящий PostgresDatabaseManager на временной SQLite-базе (JSONB → JSON,
+    как в run_local.py); postgres_db замокан для app.py, поэтому грузим напрямую."""
+
+    @classmethod
+    def setUpClass(cls):
+        import sqlalchemy
+        import sqlalchemy.dialects.postgresql as pg
+        pg.JSONB = sqlalchemy.JSON
+        spec = importlib.util.spec_from_file_location(
+            "postgres_db_real", os.path.join(_HERE, "postgres_db.py"))
+        cls.module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(cls.module)
+
+    def setUp(self):
+        import tempfile
+        self._tmp = tempfile.TemporaryDirectory()
+        self.url = "sqlite:///" + os.path.join(self._tmp.name, "test.db")
+        self.db = self.module.PostgresDatabaseManager(self.url)
+
+    def tearDown(self):
+        self.db.close()
+        self._tmp.cleanup()
+
+    def test_language_write_not_skipped_by_stale_cache(self):
+        # Another instance switched the user to uz; this one still caches ru.
+        self.db.set_user_language(1, "ru")
+        other = self.module.PostgresDatabaseManager(self.url)
+        other.set_user_language(1, "uz")
+        other.close()
+        self.db.set_user_language(1, "ru")
+        self.db._language_cache.clear()
+        self.assertEqual(self.db.get_user_language(1), "ru")
+
+    def test_failed_upgrade_step_is_not_stamped(self):
+        cls = self.module.PostgresDatabaseManager
+        self.db.close()
+        os.remove(self.url[len("sqlite:///"):])
+        with mock.patch.object(cls, "_ensure_pro_columns", return_value=False):
+            failed = cls(self.url)
+        self.assertFalse(failed._schema_is_current())
+        failed.close()
+        with mock.patch.object(cls, "_ensure_pro_columns", return_value=True) as step:
+            retried = cls(self.url)
+        step.assert_called_once()
+        self.assertTrue(retried._schema_is_current())
+        retried.close()
+
+    def test_receipt_totals_match_with_and_without_items(self):
+        empty = self.db.get_receipt_totals(5)
+        self.assertEqual(self.db.get_receipt_totals_and_items(5), (empty, []))
+        self.db.save_receipt_with_history(5, {"currency": "сум", "total": 100.5,
+                                              "items": [{"name": "Лук", "price": 100.5}]})
+        self.db.save_receipt_with_history(5, {"currency": "UZS", "total": 50,
+                                              "items": [{"name": "Хлеб", "price": 50}]})
+        self.db.save_receipt_with_history(6, {"currency": "USD", "total": 9, "items": []})
+        totals, receipts_items = self.db.get_receipt_totals_and_items(5)
+        self.assertEqual(totals, self.db.get_receipt_totals(5))
+        self.assertEqual((totals["count"], totals["total"], totals["currency"]), (2, 150.5, "UZS"))
+        self.assertEqual([items[0]["name"] for items in receipts_items], ["Хлеб", "Лук"])
+
+    def test_superseded_indexes_dropped_on_upgrade(self):
+        from sqlalchemy import inspect, text
+        with self.db.engine.begin() as conn:
+            for name in self.module.SUPERSEDED_INDEXES:
+                table = name[len("ix_"):name.rindex("_user_id")]
+                conn.execute(text(f"CREATE INDEX {name} ON {table} (user_id)"))
+        self.assertTrue(self.db._ensure_indexes())
+        inspector = inspect(self.db.engine)
+        names = {index["name"] for table in inspector.get_table_names()
+                 for index in inspector.get_indexes(table)}
+        self.assertFalse(names & set(self.module.SUPERSEDED_INDEXES))
+        self.assertIn("ix_user_history_user_created", names)
+
+    def test_write_retried_before_commit_but_not_on_commit_failure(self):
+        from sqlalchemy.exc import OperationalError
+        dropped = OperationalError("INSERT", {}, Exception("connection lost"))
+        work = mock.Mock(side_effect=[dropped, "ok"])
+        with mock.patch.object(self.module.time, "sleep"):
+            self.assertEqual(self.db._with_retry(work), "ok")
+        self.assertEqual(work.call_count, 2)
+
+        work = mock.Mock(return_value="ok")
+        with mock.patch("sqlalchemy.orm.Session.commit", side_effect=dropped), \
+                mock.patch.object(self.module.time, "sleep"):
+            with self.assertRaises(OperationalError):
+                self.db._with_retry(work)
+        work.assert_called_once()
+
+    def test_pool_stats_flag_held_connections_not_churn(self):
+        held = [self.db.engine.connect() for _ in range(3)]
+        try:
+            stats = self.db.get_pool_stats(leak_seconds=0)
+            self.assertEqual(stats["checked_out"], 3)
+            self.assertEqual(stats["held_too_long"], 3)
+            self.assertEqual(self.db.get_pool_stats()["held_too_long"], 0)
+        finally:
+            for conn in held:
+                conn.close()
+
+        # Connections cycled from many threads are never reported as held.
+        def churn():
+            for _ in range(50):
+                with self.db.engine.connect() as conn:
+                    conn.execute(self.module.text("SELECT 1"))
+        threads = [threading.Thread(target=churn) for _ in range(4)]
+        for t in threads:
+            t.start()
+        samples = []
+        while any(t.is_alive() for t in threads):
+            samples.append(self.db.get_pool_stats(leak_seconds=5)["held_too_long"])
+        for t in threads:
+            t.join()
+        self.assertEqual(set(samples) | {0}, {0})
+        stats = self.db.get_pool_stats(leak_seconds=0)
+        self.assertEqual((stats["checked_out"], stats["held_too_long"]), (0, 0))
+        self.assertEqual(stats["checkouts"], stats["checkins"])
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)